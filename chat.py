@@ -0,0 +1,148 @@
+import time
+import asyncio
+
+from loguru import logger
+from typing import Dict, Tuple
+from collections import OrderedDict
+from telegram import Bot, Chat, Update
+from telegram.constants import ChatAction
+
+
+class ChatCache:
+
+    def __init__(self, ttl: float = 300, max_size: int = 10_000):
+        """ Resolves chat metadata. Whenever possible, the chat that comes
+         with the update is used. Otherwise chats are requested from the
+         Telegram API and cached for 'ttl' seconds. At most 'max_size'
+         chats are cached, least recently requested ones are evicted """
+
+        self._ttl = ttl
+        self._max_size = max_size
+        self._chats: OrderedDict[int, Tuple[Chat, float]] = OrderedDict()
+
+        # Chats taken from the update
+        self.from_update = 0
+        # Chats taken from the cache
+        self.hits = 0
+        # Chats requested from the Telegram API
+        self.misses = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Return hit / miss counters and number of cached chats """
+
+        return {
+            "from_update": self.from_update,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached": len(self._chats)
+        }
+
+    async def get(self, bot: Bot, chat_id: int) -> Chat:
+        """ Return chat with given ID from cache or from the Telegram API """
+
+        cached = self._chats.get(chat_id)
+
+        if cached and time.monotonic() - cached[1] < self._ttl:
+            self._chats.move_to_end(chat_id)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        chat = await bot.get_chat(chat_id)
+
+        self._chats[chat_id] = (chat, time.monotonic())
+        self._chats.move_to_end(chat_id)
+
+        while len(self._chats) > self._max_size:
+            self._chats.popitem(last=False)
+
+        return chat
+
+    async def resolve(self, bot: Bot, update: Update) -> Chat | None:
+        """ Return chat of given update. Only if the update doesn't
+         contain the chat type, the chat will be requested """
+
+        chat = update.effective_chat
+
+        if not chat:
+            return None
+
+        if chat.type:
+            self.from_update += 1
+            return chat
+
+        return await self.get(bot, chat.id)
+
+
+class TypingIndicator:
+
+    def __init__(self, interval: float = 4.5):
+        """ Shows the typing indicator in chats while handlers are running.
+         Telegram shows a chat action for about 5 seconds, so it is sent
+         again every 'interval' seconds as long as at least one handler
+         is running in the chat. The action is sent in the background so
+         that it never delays a handler and it's only sent once per chat
+         and interval, no matter how many handlers are running """
+
+        self._interval = interval
+
+        # Chat ID -> time the typing action was last sent
+        self._sent: Dict[int, float] = dict()
+        # Chat ID -> number of running handlers
+        self._running: Dict[int, int] = dict()
+        # Chat ID -> task that keeps sending the typing action
+        self._tasks: Dict[int, asyncio.Task] = dict()
+
+    def start(self, bot: Bot, chat_id: int):
+        """ Show typing indicator in given chat until stop() is called """
+
+        self._running[chat_id] = self._running.get(chat_id, 0) + 1
+
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._keep_typing(bot, chat_id))
+
+    def stop(self, chat_id: int):
+        """ Stop showing typing indicator if no other handler is running in the chat """
+
+        running = self._running.get(chat_id, 0) - 1
+
+        if running > 0:
+            self._running[chat_id] = running
+            return
+
+        self._running.pop(chat_id, None)
+
+        task = self._tasks.pop(chat_id, None)
+
+        if task:
+            task.cancel()
+
+    async def _keep_typing(self, bot: Bot, chat_id: int):
+        """ Send typing action every 'interval' seconds """
+
+        try:
+            while True:
+                wait = self._interval - (time.monotonic() - self._sent.get(chat_id, 0))
+
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                self._sent[chat_id] = time.monotonic()
+
+                try:
+                    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+                except Exception as e:
+                    logger.debug(f"Can't send typing action to chat {chat_id}: {e}")
+        finally:
+            self._forget_expired()
+
+    def _forget_expired(self):
+        """ Remove send times that are too old to matter anymore """
+
+        now = time.monotonic()
+
+        for chat_id in [c for c, sent in self._sent.items() if now - sent >= self._interval]:
+            if chat_id not in self._tasks:
+                del self._sent[chat_id]
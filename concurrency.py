@@ -0,0 +1,183 @@
+import asyncio
+
+from collections import deque
+from loguru import logger
+from typing import Callable, Coroutine, Deque, Dict, Set, Tuple
+from config import ConfigManager
+
+# Overload policies
+QUEUE = "queue"
+DROP_OLDEST = "drop_oldest"
+SHED = "shed"
+
+
+class Limiter:
+
+    def __init__(self, name: str, cfg: ConfigManager, parent: "Limiter" = None):
+        """ Limits the number of concurrently running handler coroutines.
+         Settings are read from the 'concurrency' key of the given config:
+         'limit' (max running coroutines, 0 = no limit), 'policy' (what to
+         do if the limit is reached) and 'queue_size' (max waiting ones).
+
+         Policies:
+         - queue: Wait for a free slot. New ones are shed if the queue is full
+         - drop_oldest: Wait for a free slot. The oldest waiting one is dropped if the queue is full
+         - shed: Don't wait at all. New ones are shed if the limit is reached
+
+         A coroutine that was started also needs a slot of the 'parent'
+         limiter (the global one) and is subject to its policy as well.
+         Settings are read again as soon as the config has a new snapshot """
+
+        self._name = name
+        self._cfg = cfg
+        self._parent = parent
+
+        self._snapshot = None
+        self._limit = 0
+        self._policy = QUEUE
+        self._queue_size = 1000
+
+        self._running = 0
+        self._pumping = False
+        self._closed = False
+        self._waiting: Deque[Tuple[Coroutine, Callable | None]] = deque()
+
+        # Only the root limiter creates tasks and keeps references to them
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Waiting coroutines that were dropped for newer ones
+        self.dropped = 0
+        # New coroutines that were rejected
+        self.shed = 0
+
+    @property
+    def stats(self) -> Dict[str, int | str]:
+        """ Return number of running and waiting coroutines and counters """
+
+        return {
+            "limit": self._limit,
+            "policy": self._policy,
+            "running": self._running,
+            "waiting": len(self._waiting),
+            "dropped": self.dropped,
+            "shed": self.shed
+        }
+
+    def _configure(self):
+        """ Read settings from the config """
+
+        self._snapshot = self._cfg.get()
+
+        policy = self._cfg.get("concurrency", "policy") or QUEUE
+
+        if policy not in (QUEUE, DROP_OLDEST, SHED):
+            logger.error(f"Unknown concurrency policy '{policy}' for '{self._name}'")
+            policy = QUEUE
+
+        queue_size = self._cfg.get("concurrency", "queue_size")
+
+        self._limit = self._cfg.get("concurrency", "limit") or 0
+        self._policy = policy
+        self._queue_size = 1000 if queue_size is None else queue_size
+
+        # Limit might have been raised
+        self._pump()
+
+    def submit(self, coro: Coroutine, done: Callable = None):
+        """ Run coroutine as soon as the policy allows it. The optional
+         'done' callback is executed once the coroutine is finished or
+         if it was dropped without being executed """
+
+        if self._closed:
+            self._discard(coro, done)
+            return
+
+        if self._cfg.get() is not self._snapshot:
+            self._configure()
+
+        if not self._limit or self._running < self._limit:
+            self._start(coro, done)
+            return
+
+        if self._policy == SHED:
+            self.shed += 1
+            self._discard(coro, done)
+            return
+
+        if len(self._waiting) >= self._queue_size:
+            if self._policy == DROP_OLDEST and self._waiting:
+                self.dropped += 1
+                self._discard(*self._waiting.popleft())
+            else:
+                self.shed += 1
+                self._discard(coro, done)
+                return
+
+        self._waiting.append((coro, done))
+
+    def _start(self, coro: Coroutine, done: Callable | None):
+        """ Take a slot and run coroutine (after the parent admitted it) """
+
+        self._running += 1
+
+        if self._parent:
+            self._parent.submit(coro, lambda: self._finish(done))
+        else:
+            task = asyncio.create_task(self._run(coro, done))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, coro: Coroutine, done: Callable | None):
+        try:
+            await coro
+        finally:
+            self._finish(done)
+
+    def _finish(self, done: Callable | None):
+        """ Free slot and start next waiting coroutine """
+
+        self._running -= 1
+
+        if done:
+            done()
+
+        self._pump()
+
+    def _pump(self):
+        """ Start waiting coroutines while slots are free """
+
+        # Already pumping further up in the call stack
+        if self._pumping:
+            return
+
+        self._pumping = True
+
+        try:
+            while self._waiting and (not self._limit or self._running < self._limit):
+                self._start(*self._waiting.popleft())
+        finally:
+            self._pumping = False
+
+    async def close(self):
+        """ Drop waiting coroutines, don't start new ones anymore and wait
+         until running ones are finished. Waiting coroutines of limiters
+         that have this one as parent are dropped once they get started """
+
+        self._closed = True
+
+        while self._waiting:
+            self._discard(*self._waiting.popleft())
+
+        while self._tasks:
+            await asyncio.wait(set(self._tasks))
+
+    def _discard(self, coro: Coroutine, done: Callable | None):
+        """ Drop coroutine without executing it """
+
+        coro.close()
+
+        if done:
+            done()
+
+        if not self._closed:
+            logger.debug(f"Concurrency limit of '{self._name}' reached: Update dropped ({self._policy})")
@@ -1,115 +1,335 @@
+import os
+import copy
 import json
+import asyncio
+import inspect
 import logging
+import threading
 
 from pathlib import Path
+from typing import Callable
 
+try:
+    # Optional: Use inotify (or the OS equivalent) to watch files
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
 
-class ConfigManager:
 
-    # JSON content
-    _cfg = dict()
-    # Config file path
-    _cfg_file = None
+class ConfigManager:
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, write_delay: float = 0):
         """ This class takes a JSON config file and makes it available
          so that if you provide a key, you will get the value back.
          Values can also bet set or removed from the config. Setting
          and removing values will be written to the initial config file.
+
+         The file is read once into an immutable snapshot. Reading is
+         lock-free and values for key paths are memoized per snapshot.
+         Setting or removing a value creates a new snapshot (copy on
+         write) that replaces the current one in a single step.
+
+         If 'write_delay' (seconds) is set, changes are written to the
+         file in the background once the delay is over, so that several
+         changes within that time result in only one write. Call flush()
+         to write pending changes right away. Without a delay, changes are
+         written in a worker thread if an event loop is running so that
+         serializing and syncing the file never blocks the loop. Files are
+         always replaced atomically so that they are never left half written.
+
+         With watch() the file will be watched for changes that weren't
+         done through this class. Changed content will be swapped in as
+         new snapshot and all subscribed callbacks will be executed.
          """
 
+        # Config file path
+        self._cfg_file = config_file
+        # Parsed JSON content and memoized key paths of it
+        self._snapshot = (dict(), dict())
+        # Only one writer at a time
+        self._lock = threading.Lock()
+
+        # Delayed writing: version of latest snapshot and of written snapshot
+        self._write_delay = write_delay
+        self._write_lock = threading.Lock()
+        self._write_handle = None
+        self._version = 0
+        self._written = 0
+
+        # Watching the file: last known mtime, watcher task and callbacks
+        self._mtime = None
+        self._watcher = None
+        self._callbacks = list()
+
         if config_file:
-            self._cfg_file = config_file
-            self._read_cfg()
+            self._snapshot = (self._read_cfg() or dict(), dict())
         else:
             logging.error("ERROR: No config file provided")
 
-    def _read_cfg(self):
-        """ Read the JSON content of a given configuration file """
+    def _read_cfg(self) -> dict | None:
+        """ Read the JSON content of a given configuration file.
+        Returns None if the file exists but can't be read """
 
         try:
             if Path(self._cfg_file).is_file():
+                self._mtime = self._get_mtime()
+
                 with open(self._cfg_file) as config_file:
-                    self._cfg = json.load(config_file)
+                    return json.load(config_file)
             else:
-                self._cfg = {}
+                return dict()
         except Exception as e:
             err = f"Can't read '{self._cfg_file}'"
             logging.error(f"{repr(e)} - {err}")
 
-    def _write_cfg(self):
-        """ Write the JSON dictionary into the given configuration file """
+    def _write_cfg(self, cfg: dict, version: int):
+        """ Write the JSON dictionary into the given configuration file. The
+        content is written to a temporary file first that then replaces
+        the config file. Older versions than the one already written are
+        skipped in case a delayed write and a flush overtake each other """
+
+        with self._write_lock:
+            if version <= self._written:
+                return
+
+            tmp_file = Path(f"{self._cfg_file}.tmp")
+
+            try:
+                Path(self._cfg_file).parent.mkdir(parents=True, exist_ok=True)
+
+                with open(tmp_file, "w") as config_file:
+                    json.dump(cfg, config_file, indent=4)
+                    config_file.flush()
+                    os.fsync(config_file.fileno())
+
+                os.replace(tmp_file, self._cfg_file)
+                self._written = version
+                self._mtime = self._get_mtime()
+            except Exception as e:
+                err = f"Can't write '{self._cfg_file}'"
+                logging.error(f"{repr(e)} - {err}")
+
+    @property
+    def write_delay(self) -> float:
+        """ Return seconds that changes are collected before writing them """
+        return self._write_delay
+
+    @write_delay.setter
+    def write_delay(self, write_delay: float):
+        self._write_delay = write_delay
+
+    def _save(self, cfg: dict):
+        """ Swap in new snapshot and write it into the configuration
+        file, either right away or delayed. Called with writer lock """
+
+        self._snapshot = (cfg, dict())
+        self._version += 1
 
         try:
-            Path(self._cfg_file).parent.mkdir(parents=True, exist_ok=True)
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
 
-            with open(self._cfg_file, "w") as config_file:
-                json.dump(self._cfg, config_file, indent=4)
-        except Exception as e:
-            err = f"Can't write '{self._cfg_file}'"
-            logging.error(f"{repr(e)} - {err}")
+        if not loop:
+            self._write_cfg(cfg, self._version)
+        elif self._write_delay:
+            if not self._write_handle:
+                self._write_handle = loop.call_later(self._write_delay, self._write_later)
+        else:
+            loop.run_in_executor(None, self._write_cfg, cfg, self._version)
+
+    def _write_later(self):
+        """ Write latest snapshot in a worker thread """
+
+        with self._lock:
+            self._write_handle = None
+            cfg, version = self._snapshot[0], self._version
+
+        asyncio.get_running_loop().run_in_executor(None, self._write_cfg, cfg, version)
+
+    def flush(self):
+        """ Write pending changes into the configuration file right away """
+
+        with self._lock:
+            if self._write_handle:
+                self._write_handle.cancel()
+                self._write_handle = None
+
+            cfg, version = self._snapshot[0], self._version
+
+        self._write_cfg(cfg, version)
+
+    def _get_mtime(self) -> int | None:
+        """ Return modification time of the config file in nanoseconds """
+
+        try:
+            return os.stat(self._cfg_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def subscribe(self, callback: Callable):
+        """ Execute given callback (sync or async) with this ConfigManager
+        as argument whenever a watched config file changed """
+
+        if callback not in self._callbacks:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable):
+        """ Remove given callback from the list of subscribers """
+
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def watch(self, interval: float = 1):
+        """ Start watching the config file for changes. Uses 'watchfiles'
+        (inotify on Linux) if installed, otherwise the mtime of the file
+        will be checked every 'interval' seconds """
+
+        if not self._watcher:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch(interval))
+
+    def unwatch(self):
+        """ Stop watching the config file """
+
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def _watch(self, interval: float):
+        """ Check config file whenever it might have changed """
+
+        if awatch:
+            try:
+                name = Path(self._cfg_file).name
+
+                async for changes in awatch(Path(self._cfg_file).parent, debounce=100):
+                    if any(Path(path).name == name for _, path in changes):
+                        await self._check()
+            except Exception as e:
+                logging.warning(f"{repr(e)} - Can't watch '{self._cfg_file}', polling instead")
+
+        while True:
+            await asyncio.sleep(interval)
+            await self._check()
+
+    async def _check(self):
+        """ Reload config file if it was changed and inform subscribers """
+
+        mtime = await asyncio.to_thread(self._get_mtime)
+
+        if mtime is None or mtime == self._mtime:
+            return
+        if not await asyncio.to_thread(self.reload):
+            return
+
+        logging.info(f"Config '{self._cfg_file}' reloaded")
+
+        for callback in list(self._callbacks):
+            try:
+                result = callback(self)
+
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.error(f"{repr(e)} - Config callback for '{self._cfg_file}' failed")
+
+    def reload(self) -> bool:
+        """ Read the configuration file again and replace the current
+        snapshot. If the file can't be read, the snapshot is kept. If there
+        are changes that are not yet written, they are written right away
+        instead and take precedence over the changed file """
+
+        with self._lock:
+            pending = self._write_handle is not None
+
+            if pending:
+                self._write_handle.cancel()
+                self._write_handle = None
+            else:
+                cfg = self._read_cfg()
+
+                if cfg is None:
+                    return False
+
+                self._snapshot = (cfg, dict())
+                return True
+
+            cfg, version = self._snapshot[0], self._version
+
+        logging.warning(f"Config '{self._cfg_file}' changed while changes were pending - Writing pending changes")
+        self._write_cfg(cfg, version)
+        return False
 
     def get(self, *keys):
-        """ Return the value of the given key(s) from a configuration file """
+        """ Return the value of the given key(s) from a configuration file.
+        Returned dicts and lists are part of the snapshot and must not be
+        changed. Use set() or remove() for that """
 
-        if not self._cfg:
-            self._read_cfg()
+        cfg, cache = self._snapshot
 
         if not keys:
-            return self._cfg
-
-        value = self._cfg
+            return cfg
 
         try:
-            for key in keys:
+            return cache[keys]
+        except KeyError:
+            pass
+
+        value = cfg
+
+        for key in keys:
+            if isinstance(value, dict) and key in value:
                 value = value[key]
-        except Exception as e:
-            err = f"Can't get '{keys}' from '{self._cfg_file}'"
-            logging.debug(f"{repr(e)} - {err}")
-            return None
+            elif isinstance(value, list) and isinstance(key, int) and -len(value) <= key < len(value):
+                value = value[key]
+            else:
+                logging.debug(f"Can't get '{keys}' from '{self._cfg_file}'")
+                value = None
+                break
 
+        cache[keys] = value
         return value
 
     def set(self, value, *keys):
         """ Set a new value for the given key(s) in the configuration file.
         Will also execute the callback method if there is one """
 
-        if not self._cfg:
-            self._read_cfg()
-
         if not keys:
             return
 
-        tmp_cfg = self._cfg
+        with self._lock:
+            cfg = copy.deepcopy(self._snapshot[0])
+            tmp_cfg = cfg
 
-        try:
-            for key in keys[:-1]:
-                tmp_cfg = tmp_cfg.setdefault(key, {})
-            tmp_cfg[keys[-1]] = value
+            try:
+                for key in keys[:-1]:
+                    tmp_cfg = tmp_cfg.setdefault(key, {})
+                tmp_cfg[keys[-1]] = value
+            except Exception as e:
+                err = f"Can't set '{keys}' in '{self._cfg_file}'"
+                logging.debug(f"{repr(e)} - {err}")
+                return
 
-            self._write_cfg()
-        except Exception as e:
-            err = f"Can't set '{keys}' in '{self._cfg_file}'"
-            logging.debug(f"{repr(e)} - {err}")
+            self._save(cfg)
 
     def remove(self, *keys):
         """ Remove given key(s) from the configuration file.
         Will also execute the callback method if there is one """
 
-        if not self._cfg:
-            self._read_cfg()
-
         if not keys:
             return
 
-        tmp_cfg = self._cfg
+        with self._lock:
+            cfg = copy.deepcopy(self._snapshot[0])
+            tmp_cfg = cfg
 
-        try:
-            for key in keys[:-1]:
-                tmp_cfg = tmp_cfg.setdefault(key, {})
-            del tmp_cfg[keys[-1]]
-
-            self._write_cfg()
-        except KeyError as e:
-            err = f"Can't remove key '{keys}' from '{self._cfg_file}'"
-            logging.debug(f"{repr(e)} - {err}")
+            try:
+                for key in keys[:-1]:
+                    tmp_cfg = tmp_cfg.setdefault(key, {})
+                del tmp_cfg[keys[-1]]
+            except KeyError as e:
+                err = f"Can't remove key '{keys}' from '{self._cfg_file}'"
+                logging.debug(f"{repr(e)} - {err}")
+                return
+
+            self._save(cfg)
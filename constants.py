@@ -8,10 +8,12 @@ DIR_LOG = Path('log')
 DIR_DAT = Path('dat')
 DIR_TMP = Path('tmp')
 DIR_BCK = Path('bck')
+DIR_MIG = Path('migrations')
 
 # Extensions
 CFG_EXT = '.cfg'
 DAT_EXT = '.db'
+SQL_EXT = '.sql'
 
 # Files
 FILE_DAT = Path('global').with_suffix(DAT_EXT)
@@ -0,0 +1,413 @@
+import sqlite3
+import asyncio
+
+from pathlib import Path
+from loguru import logger
+from typing import Dict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Database:
+
+    # Number of idle read-only connections kept open for reuse
+    MAX_IDLE_READERS = 2
+
+    # Max number of databases attached at the same time (SQLite default limit)
+    MAX_ATTACHED = 10
+
+    def __init__(self, path: Path, busy_timeout: int, mmap_size: int):
+        """ Long-lived connection to a single SQLite database file. The
+         connection is opened lazily and all statements are executed on
+         a dedicated worker thread so that database access never blocks
+         the event loop. Since there is only one worker thread per file,
+         statements on the same database are executed one after another """
+
+        self._path = Path(path)
+        self._busy_timeout = busy_timeout
+        self._mmap_size = mmap_size
+
+        self._con = None
+        self._readers = list()
+
+        # Connection with other databases attached: alias -> path
+        self._attach_con = None
+        self._attached: Dict[str, Path] = dict()
+
+        # Held while a statement or a whole transaction uses the connection
+        self._lock = asyncio.Lock()
+        self._tx_task = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"db-{self._path.stem}")
+
+    @property
+    def path(self) -> Path:
+        """ Return the path of the database file """
+        return self._path
+
+    def _connect(self, uri: bool = False) -> sqlite3.Connection:
+        """ Open and configure a new connection. Pragmas are only set once
+         per connection and not for every executed statement. If 'uri' is
+         set, the connection accepts URIs (needed to attach read-only) """
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+        con = sqlite3.connect(
+            self._path.as_uri() if uri else self._path,
+            timeout=self._busy_timeout / 1000,
+            check_same_thread=False,
+            uri=uri)
+
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(self._busy_timeout)}")
+        con.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+
+        logger.debug(f"Database '{self._path}' connected")
+        return con
+
+    def _get_con(self) -> sqlite3.Connection:
+        """ Return the connection of this database. Runs on the worker thread """
+
+        if not self._con:
+            self._con = self._connect()
+        return self._con
+
+    def _execute(self, sql, args) -> list:
+        """ Execute a single statement and commit. Runs on the worker thread """
+
+        con = self._get_con()
+        cur = con.cursor()
+
+        try:
+            cur.execute(sql, args)
+            data = cur.fetchall()
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cur.close()
+
+        return data
+
+    def _executemany(self, sql, rows) -> int:
+        """ Execute statement for all given rows in a single
+         transaction and commit. Runs on the worker thread """
+
+        con = self._get_con()
+        cur = con.cursor()
+
+        try:
+            cur.executemany(sql, rows)
+            count = cur.rowcount
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cur.close()
+
+        return count
+
+    def _begin(self):
+        """ Start a transaction and acquire the write lock right away so
+         that the transaction can't fail later on because of another
+         connection that is writing. Runs on the worker thread """
+
+        self._get_con().execute("BEGIN IMMEDIATE")
+
+    def _commit(self):
+        """ Commit current transaction. Runs on the worker thread """
+        self._con.commit()
+
+    def _rollback(self):
+        """ Roll back current transaction. Runs on the worker thread """
+        self._con.rollback()
+
+    def _tx_execute(self, sql, args) -> int:
+        """ Execute statement without committing. Runs on the worker thread """
+        return self._con.execute(sql, args).rowcount
+
+    def _tx_executemany(self, sql, rows) -> int:
+        """ Execute statement for all rows without committing. Runs on the worker thread """
+        return self._con.executemany(sql, rows).rowcount
+
+    def _tx_fetch(self, sql, args) -> list:
+        """ Execute statement and return all rows without committing. Runs on the worker thread """
+        return self._con.execute(sql, args).fetchall()
+
+    def _migrate(self, migrations) -> int:
+        """ Apply all migrations with a version higher than the current
+         'user_version' of the database. Every migration is executed in
+         its own transaction together with the version bump. Returns the
+         resulting version. Runs on the worker thread """
+
+        con = self._get_con()
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+
+        for number, path in sorted(migrations):
+            if number <= version:
+                continue
+
+            with open(path, "r", encoding="utf8") as f:
+                script = f.read()
+
+            try:
+                con.executescript(f"BEGIN;\n{script};\nPRAGMA user_version = {int(number)};\nCOMMIT;")
+            except Exception:
+                if con.in_transaction:
+                    con.rollback()
+                raise
+
+            version = number
+            logger.info(f"Database '{self._path}' migrated to version {version}")
+
+        return version
+
+    def _execute_attached(self, sql, args, attachments) -> list:
+        """ Attach given databases read-only to a dedicated connection,
+         execute statement on it and commit. Databases that are already
+         attached under the same alias stay attached for the next call.
+         Runs on the worker thread """
+
+        if not self._attach_con:
+            self._attach_con = self._connect(uri=True)
+
+        con = self._attach_con
+
+        for alias, path in list(self._attached.items()):
+            if alias in attachments and attachments[alias] == path:
+                continue
+            if alias not in attachments and len(self._attached) + len(attachments) <= self.MAX_ATTACHED:
+                continue
+
+            con.execute("DETACH DATABASE ?", (alias,))
+            del self._attached[alias]
+
+        for alias, path in attachments.items():
+            if alias in self._attached:
+                continue
+
+            con.execute("ATTACH DATABASE ? AS ?", (f"{path.as_uri()}?mode=ro", alias))
+            self._attached[alias] = path
+
+        cur = con.cursor()
+
+        try:
+            cur.execute(sql, args)
+            data = cur.fetchall()
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            cur.close()
+
+        return data
+
+    def _close(self):
+        """ Close the connection. Runs on the worker thread """
+
+        if self._con:
+            self._con.close()
+            self._con = None
+
+        if self._attach_con:
+            self._attach_con.close()
+            self._attach_con = None
+            self._attached.clear()
+
+        while self._readers:
+            self._readers.pop().close()
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        """ Open a read-only connection for streaming queries. Thanks to
+         WAL, readers don't block the writer connection and vice versa """
+
+        con = self._connect()
+        con.execute("PRAGMA query_only=1")
+        return con
+
+    async def _run_in_thread(self, func, *args):
+        """ Execute given function on the worker thread of this database """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _run(self, func, *args):
+        """ Execute given function on the worker thread of this
+         database as soon as no transaction is using the connection """
+
+        if self._tx_task and self._tx_task is asyncio.current_task():
+            raise RuntimeError(f"Use the transaction handle while a transaction on '{self._path}' is open")
+
+        async with self._lock:
+            return await self._run_in_thread(func, *args)
+
+    async def execute(self, sql, args=()) -> list:
+        """ Execute SQL statement and return all resulting rows """
+        return await self._run(self._execute, sql, tuple(args))
+
+    async def execute_attached(self, sql, args=(), attachments: Dict[str, Path] = None) -> list:
+        """ Execute SQL statement with other databases attached read-only
+         under the given aliases (alias -> database path) and return all
+         resulting rows. This database itself is available as 'main' """
+
+        attachments = {a: Path(p).resolve() for a, p in (attachments or {}).items()}
+
+        if len(attachments) > self.MAX_ATTACHED:
+            raise ValueError(f"Can't attach more than {self.MAX_ATTACHED} databases")
+
+        return await self._run(self._execute_attached, sql, tuple(args), attachments)
+
+    async def executemany(self, sql, rows, chunk_size: int = 0) -> int:
+        """ Execute SQL statement for every row and return the number of
+         affected rows. 'rows' can be an iterable or an async iterable of
+         parameter tuples. If 'chunk_size' is set, a commit will be done
+         after every chunk, otherwise all rows are written in one go """
+
+        count = 0
+
+        if not chunk_size and not hasattr(rows, "__aiter__"):
+            return await self._run(self._executemany, sql, [tuple(r) for r in rows])
+
+        chunk = list()
+
+        if hasattr(rows, "__aiter__"):
+            async for row in rows:
+                chunk.append(tuple(row))
+
+                if chunk_size and len(chunk) >= chunk_size:
+                    count += await self._run(self._executemany, sql, chunk)
+                    chunk = list()
+        else:
+            for row in rows:
+                chunk.append(tuple(row))
+
+                if len(chunk) >= chunk_size:
+                    count += await self._run(self._executemany, sql, chunk)
+                    chunk = list()
+
+        if chunk:
+            count += await self._run(self._executemany, sql, chunk)
+
+        return count
+
+    @asynccontextmanager
+    async def transaction(self):
+        """ Open a transaction and return a Transaction handle to execute
+         statements in it. The transaction will be committed at the end of
+         the 'async with' block or rolled back if an exception is raised.
+         Other statements on this database wait until it's finished """
+
+        if self._tx_task and self._tx_task is asyncio.current_task():
+            raise RuntimeError(f"Transaction on '{self._path}' is already open")
+
+        async with self._lock:
+            await self._run_in_thread(self._begin)
+            self._tx_task = asyncio.current_task()
+
+            try:
+                yield Transaction(self)
+                await self._run_in_thread(self._commit)
+            except BaseException:
+                await self._run_in_thread(self._rollback)
+                raise
+            finally:
+                self._tx_task = None
+
+    async def migrate(self, migrations) -> int:
+        """ Apply migrations given as (version, path to SQL file) tuples
+         that haven't been applied yet and return the current version """
+        return await self._run(self._migrate, list(migrations))
+
+    async def iterate(self, sql, args=(), chunk_size: int = 500):
+        """ Execute SQL statement and yield the resulting rows in chunks
+         of 'chunk_size' rows. A separate read-only connection is used
+         and only held while the iteration is in progress """
+
+        if self._readers:
+            con = self._readers.pop()
+        else:
+            con = await asyncio.to_thread(self._connect_reader)
+
+        cur = None
+
+        try:
+            cur = await asyncio.to_thread(con.execute, sql, tuple(args))
+
+            while rows := await asyncio.to_thread(cur.fetchmany, chunk_size):
+                yield rows
+        finally:
+            if cur:
+                cur.close()
+
+            if len(self._readers) < self.MAX_IDLE_READERS:
+                self._readers.append(con)
+            else:
+                con.close()
+
+    async def close(self):
+        """ Close the connection and stop the worker thread """
+
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class Transaction:
+
+    def __init__(self, database: Database):
+        """ Handle for an open transaction on a database. Only valid
+         within the 'async with' block of Database.transaction() """
+
+        self._database = database
+
+    async def execute(self, sql, *args) -> int:
+        """ Execute SQL statement and return the number of affected rows """
+        return await self._database._run_in_thread(self._database._tx_execute, sql, args)
+
+    async def executemany(self, sql, rows) -> int:
+        """ Execute SQL statement for every row and return the number of affected rows """
+        return await self._database._run_in_thread(
+            self._database._tx_executemany, sql, [tuple(r) for r in rows])
+
+    async def fetch(self, sql, *args) -> list:
+        """ Execute SQL statement and return all resulting rows """
+        return await self._database._run_in_thread(self._database._tx_fetch, sql, args)
+
+
+class DatabasePool:
+
+    def __init__(self, busy_timeout: int = 5000, mmap_size: int = 268_435_456):
+        """ Framework owned pool of SQLite databases, keyed by the path of
+         the database file. Each database keeps one long-lived connection
+         that is configured once (WAL journal, synchronous=NORMAL,
+         busy_timeout in milliseconds and mmap_size in bytes) """
+
+        self._busy_timeout = busy_timeout
+        self._mmap_size = mmap_size
+
+        self._databases: Dict[Path, Database] = dict()
+
+    def get(self, path: Path | str) -> Database:
+        """ Return database for given path. Will be created if it doesn't exist """
+
+        path = Path(path).resolve()
+
+        if path not in self._databases:
+            self._databases[path] = Database(path, self._busy_timeout, self._mmap_size)
+
+        return self._databases[path]
+
+    async def close(self):
+        """ Close all databases in the pool """
+
+        for path, database in list(self._databases.items()):
+            try:
+                await database.close()
+            except Exception as e:
+                logger.error(f"Can't close database '{path}': {e}")
+
+        self._databases.clear()
@@ -8,11 +8,20 @@ import constants as con
 from pathlib import Path
 from loguru import logger
 from dotenv import load_dotenv
+from telegram import Update
 from telegram.error import InvalidToken
 from telegram.constants import ParseMode
 from telegram.ext import Application, Defaults
 from config import ConfigManager
 from web import WebAppWrapper
+from db import DatabasePool
+from resources import ResourceCache
+from chat import ChatCache, TypingIndicator
+from router import Router
+from concurrency import Limiter
+from scheduler import ChatScheduler
+from outbound import OutboundScheduler, NOTIFY
+from workers import Supervisor, Worker
 
 
 class TelegramBot:
@@ -21,34 +30,96 @@ class TelegramBot:
         self.bot = None
         self.cfg = None
         self.web = None
+        self.db = None
+        self.resources = None
+        self.chats = None
+        self.typing = None
+        self.router = None
+        self.concurrency = None
+        self.scheduler = None
+        self.outbound = None
+        self.worker = None
         self.plugins = dict()
 
-    async def run(self, config: ConfigManager, token: str):
+    async def run(self, config: ConfigManager, token: str, worker: Worker = None):
+        """ Run the bot. If 'worker' is given, the bot runs as worker process
+         of a Supervisor. Updates are then received from the supervisor and
+         database statements are executed by the supervisor process """
+
         self.cfg = config
+        self.worker = worker
+
+        if self.cfg.get('webhook', 'enabled') and not self.cfg.get('webhook', 'secret_token'):
+            logger.error("Webhook enabled but no 'secret_token' configured")
+            return
+
+        # Workers share the overall limit for outgoing requests
+        workers = worker.count if worker else 1
+
+        overall_rate = self.cfg.get('outbound', 'overall_rate')
+        group_rate = self.cfg.get('outbound', 'group_rate')
+        max_retries = self.cfg.get('outbound', 'max_retries')
+
+        # Init scheduler for outgoing Bot API requests
+        self.outbound = OutboundScheduler(
+            overall_rate=(30 if overall_rate is None else overall_rate) / workers,
+            group_rate=1 if group_rate is None else group_rate,
+            max_retries=3 if max_retries is None else max_retries
+        )
 
         # Init bot
         self.bot = (
             Application.builder()
             .defaults(Defaults(parse_mode=ParseMode.HTML))
+            .rate_limiter(self.outbound)
             .token(token)
             .build()
         )
 
+        # Init global concurrency limit and router that dispatches updates to plugin handlers
+        self.concurrency = Limiter("global", self.cfg)
+        self.scheduler = ChatScheduler(idle_timeout=self.cfg.get('chat_queue_idle_timeout') or 60)
+        self.router = Router(self.bot, self.concurrency, self.scheduler)
+        self.bot.add_handler(self.router.handler)
+
         # Init webserver
         self.web = WebAppWrapper(
             res_path=con.DIR_RES,
             port=self.cfg.get('webserver_port')
         )
 
+        # Init database pool
+        if worker:
+            self.db = worker.db
+        else:
+            self.db = DatabasePool(
+                busy_timeout=self.cfg.get('database', 'busy_timeout') or 5000,
+                mmap_size=self.cfg.get('database', 'mmap_size') or 268_435_456
+            )
+
+        # Init resource cache
+        check_interval = self.cfg.get('resource_check_interval')
+        self.resources = ResourceCache(5 if check_interval is None else check_interval)
+
+        # Init chat cache
+        self.chats = ChatCache(ttl=self.cfg.get('chat_cache_ttl') or 300)
+        self.typing = TypingIndicator()
+
+        # Reload global config on change
+        if self.cfg.get('cfg_watch'):
+            self.cfg.watch()
+
         # Load all plugins
         await self.load_plugins()
 
         try:
             # Notify admin about bot start
-            await self.bot.updater.bot.send_message(
-                chat_id=self.cfg.get('admin_tg_id'),
-                text=f'{con.ROBOT} Bot is up and running!'
-            )
+            if not worker or worker.primary:
+                await self.bot.updater.bot.send_message(
+                    chat_id=self.cfg.get('admin_tg_id'),
+                    text=f'{con.ROBOT} Bot is up and running!',
+                    rate_limit_args=NOTIFY
+                )
         except InvalidToken:
             logger.error('Invalid Telegram bot token')
             return
@@ -58,15 +129,80 @@ class TelegramBot:
             await self.bot.initialize()
             logger.info("Starting bot...")
             await self.bot.start()
-            logger.info("Polling for updates...")
-            await self.bot.updater.start_polling(drop_pending_updates=True)
-            logger.info("Starting webserver...")
-            await self.web.run().serve()
+
+            if worker:
+                logger.info(f"Worker {worker.index} receiving updates...")
+                feeder = asyncio.create_task(worker.feed(self))
+            elif self.cfg.get('webhook', 'enabled'):
+                await self.start_webhook()
+            else:
+                logger.info("Polling for updates...")
+                await self.bot.updater.start_polling(drop_pending_updates=True)
+
+            if not worker or worker.primary:
+                logger.info("Starting webserver...")
+                server = self.web.run()
+
+                if worker:
+                    # Supervisor decides when to stop
+                    server.install_signal_handlers = lambda: None
+                    worker_stopped = asyncio.create_task(worker.stopped.wait())
+                    worker_stopped.add_done_callback(lambda _: setattr(server, 'should_exit', True))
+
+                await server.serve()
+
+            if worker:
+                await feeder
 
             # Shutdown bot
-            await self.bot.updater.stop()
+            if self.bot.updater.running:
+                await self.bot.updater.stop()
             await self.bot.stop()
 
+            # Stop ordered update processing and wait for running handlers so
+            # that they are finished before plugins clean up and the DB closes
+            await self.scheduler.close()
+            await self.concurrency.close()
+
+        # Let plugins clean up (flush buffers etc.)
+        for name, plugin in list(self.plugins.items()):
+            try:
+                await plugin.cleanup()
+            except Exception as e:
+                logger.error(f"Plugin '{name}' cleanup failed: {e}")
+
+            plugin.cfg.flush()
+
+        self.cfg.flush()
+
+        # Close database connections
+        await self.db.close()
+
+    async def start_webhook(self):
+        """ Receive updates via the webserver instead of polling. If no URL
+         is configured, the webhook isn't registered with Telegram and the
+         route only accepts updates that are posted to it directly """
+
+        path = self.cfg.get('webhook', 'path') or '/telegram'
+        url = self.cfg.get('webhook', 'url')
+        secret_token = self.cfg.get('webhook', 'secret_token')
+
+        async def put_update(data: dict):
+            await self.bot.update_queue.put(Update.de_json(data, self.bot.bot))
+
+        self.web.add_webhook(path, put_update, secret_token)
+
+        if url:
+            logger.info("Setting webhook...")
+            await self.bot.bot.set_webhook(
+                url=url.rstrip('/') + path,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True
+            )
+        else:
+            logger.warning(f"No webhook URL configured. Updates need to be posted to '{path}'")
+
     async def load_plugins(self):
         """ Load all plugins from the 'plg' folder """
 
@@ -76,16 +212,20 @@ class TelegramBot:
                     if folder.startswith("_"):
                         continue
                     logger.info(f"Plugin '{folder}' loading...")
-                    await self.enable_plugin(folder)
+                    await self.enable_plugin(folder, broadcast=False)
                 break
         except Exception as e:
             logger.error(e)
 
-    async def enable_plugin(self, name):
-        """ Load a single plugin """
+    async def enable_plugin(self, name, broadcast: bool = True):
+        """ Load a single plugin. If 'broadcast' is set, all other
+         workers load the plugin as well (if running as worker) """
 
         # If already enabled, disable first
-        await self.disable_plugin(name)
+        await self.disable_plugin(name, broadcast=False)
+
+        # Make sure that changed resources will be reloaded
+        self.resources.invalidate(con.DIR_PLG / name)
 
         try:
             module_path = f"{con.DIR_PLG}.{name}.{name}"
@@ -97,6 +237,10 @@ class TelegramBot:
                 self.plugins[name] = plugin
                 msg = f"Plugin '{name}' enabled"
                 logger.info(msg)
+
+                if broadcast and self.worker:
+                    self.worker.broadcast("enable_plugin", name)
+
                 return True, msg
 
         except Exception as e:
@@ -104,9 +248,10 @@ class TelegramBot:
             logger.error(msg)
             return False, str(e)
 
-    async def disable_plugin(self, name):
+    async def disable_plugin(self, name, broadcast: bool = True):
         """ Remove a plugin from the plugin list and also
-         remove all its handlers and endpoints """
+         remove all its handlers and endpoints. If 'broadcast' is
+         set, all other workers disable the plugin as well """
 
         if name in self.plugins:
             plugin = self.plugins[name]
@@ -114,10 +259,14 @@ class TelegramBot:
             # Run plugin's own cleanup method
             await plugin.cleanup()
 
+            # Stop watching config and write pending changes before plugin gets reloaded
+            plugin.cfg.unwatch()
+            plugin.cfg.flush()
+            self.cfg.unsubscribe(plugin.cfg_changed)
+
             # Remove plugin handlers
-            for group, handler in plugin.handlers.items():
-                self.bot.remove_handler(handler, group)
-            plugin.handlers.clear()
+            for handler in list(plugin.handlers):
+                await plugin.remove_handler(handler)
 
             # Remove plugin endpoints
             for endpoint in plugin.endpoints:
@@ -132,12 +281,16 @@ class TelegramBot:
 
             msg = f"Plugin '{name}' disabled"
             logger.info(msg)
+
+            if broadcast and self.worker:
+                self.worker.broadcast("disable_plugin", name)
+
             return True, msg
 
 
-if __name__ == "__main__":
-    # Load data from .env file
-    load_dotenv()
+def init_logging(suffix: str = ""):
+    """ Set up loguru logger. Log files get the given suffix
+     so that every worker process writes its own file """
 
     # Read parameters from .env file
     log_level = os.getenv('LOG_LEVEL') if os.getenv('LOG_LEVEL') else 'INFO'
@@ -154,13 +307,25 @@ if __name__ == "__main__":
     # Save log in file
     if log_into_file:
         logger.add(
-            Path(Path('log') / Path('{time}.log')),
+            Path(Path('log') / Path(f'{{time}}{"-" + suffix if suffix else ""}.log')),
             format="{time} {name} {message}",
             level=log_level,
             rotation="5 MB"
         )
 
-    asyncio.run(TelegramBot().run(
-        ConfigManager(con.DIR_CFG / con.FILE_CFG),
-        os.getenv('TG_TOKEN'))
-    )
+
+if __name__ == "__main__":
+    # Load data from .env file
+    load_dotenv()
+
+    init_logging()
+
+    config = ConfigManager(con.DIR_CFG / con.FILE_CFG)
+    config.write_delay = config.get('cfg_write_delay') or 0
+
+    workers = config.get('workers', 'count') or 0
+
+    if workers > 1:
+        asyncio.run(Supervisor(config, os.getenv('TG_TOKEN'), workers).run())
+    else:
+        asyncio.run(TelegramBot().run(config, os.getenv('TG_TOKEN')))
@@ -0,0 +1,275 @@
+import time
+import asyncio
+
+from collections import deque
+from loguru import logger
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Tuple
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Priority lanes for 'rate_limit_args' of Bot API calls (lower goes first)
+REPLY = 0
+NOTIFY = 1
+LOW = 2
+
+
+class TokenBucket:
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        """ Allows 'rate' requests per second with bursts of
+         up to 'capacity' requests after being idle """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """ Return seconds until the next request is allowed """
+
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        """ Use up one request """
+
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """ Return True if the bucket was idle long enough to be forgotten """
+
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter[int]):
+
+    # Names of the priority lanes for metrics
+    LANES = ("reply", "notify", "low")
+
+    # Lane of endpoints if no priority was given with 'rate_limit_args'
+    ENDPOINT_LANES = {
+        "deleteMessage": LOW,
+        "deleteMessages": LOW,
+        "sendChatAction": LOW
+    }
+
+    # Endpoints that don't use up the per-group limit since they don't send
+    # a message. Otherwise a typing action would delay the following reply
+    UNLIMITED_ENDPOINTS = frozenset({"sendChatAction"})
+
+    # Max number of per-chat buckets before idle ones are removed
+    MAX_BUCKETS = 10_000
+
+    def __init__(self, overall_rate: float = 30, group_rate: float = 1, max_retries: int = 3):
+        """ Schedules all Bot API requests that are sent to a chat. At most
+         'overall_rate' requests per second are sent in total and at most
+         'group_rate' requests per second to the same group, both enforced
+         with token buckets. Waiting requests are kept in priority lanes
+         (REPLY, NOTIFY, LOW) that can be chosen per request with
+         'rate_limit_args'. If Telegram answers with RetryAfter, sending is
+         paused for the given time and the request is retried up to
+         'max_retries' times. Requests without a chat are not limited.
+         A rate of 0 disables the corresponding limit """
+
+        self._overall = TokenBucket(overall_rate, overall_rate) if overall_rate else None
+        self._group_rate = group_rate
+        self._max_retries = max_retries
+
+        # Chat ID -> bucket of that group
+        self._buckets: Dict[Any, TokenBucket] = dict()
+        # Waiting requests per lane: (chat ID, future that releases the request)
+        self._lanes: Tuple[Deque[Tuple[Any, asyncio.Future]], ...] = tuple(deque() for _ in self.LANES)
+
+        self._paused_until = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        # Requests sent
+        self.sent = 0
+        # Requests that were retried after a RetryAfter
+        self.retries = 0
+        # Requests that failed because of too many RetryAfter
+        self.failed = 0
+
+    @property
+    def stats(self) -> Dict[str, int | float]:
+        """ Return number of waiting requests per lane and counters """
+
+        stats = {name: len(lane) for name, lane in zip(self.LANES, self._lanes)}
+        stats["sent"] = self.sent
+        stats["retries"] = self.retries
+        stats["failed"] = self.failed
+        stats["paused"] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+        return stats
+
+    async def initialize(self):
+        self._start()
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        # Release all waiting requests so that they don't wait forever
+        for lane in self._lanes:
+            while lane:
+                _, future = lane.popleft()
+
+                if not future.done():
+                    future.set_result(None)
+
+    def _start(self):
+        """ Start dispatching waiting requests if not running yet """
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def process_request(
+            self,
+            callback: Callable[..., Coroutine[Any, Any, bool | Dict[str, Any] | List[Dict[str, Any]]]],
+            args: Any,
+            kwargs: Dict[str, Any],
+            endpoint: str,
+            data: Dict[str, Any],
+            rate_limit_args: int | None):
+
+        chat_id = data.get("chat_id")
+
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        if rate_limit_args in (REPLY, NOTIFY, LOW):
+            lane = rate_limit_args
+        else:
+            lane = self.ENDPOINT_LANES.get(endpoint, REPLY)
+
+        # Requests without per-group limit are only subject to the overall limit
+        limited_chat = None if endpoint in self.UNLIMITED_ENDPOINTS else chat_id
+
+        for attempt in range(self._max_retries + 1):
+            await self._acquire(lane, limited_chat)
+
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                retry_after = getattr(retry_after, "total_seconds", lambda: retry_after)()
+
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+                if attempt >= self._max_retries:
+                    self.failed += 1
+                    raise
+
+                self.retries += 1
+                logger.warning(f"Flood control for '{endpoint}' in chat {chat_id}: Retry in {retry_after} seconds")
+
+    async def _acquire(self, lane: int, chat_id: Any):
+        """ Wait until the request is allowed to be sent. Without a
+         chat ID, only the overall limit needs to allow it """
+
+        future = asyncio.get_running_loop().create_future()
+
+        self._lanes[lane].append((chat_id, future))
+        self._wakeup.set()
+        self._start()
+
+        await future
+
+    def _get_bucket(self, chat_id: Any, now: float) -> TokenBucket | None:
+        """ Return bucket of given chat. Private chats (positive IDs) don't have one """
+
+        if chat_id is None or not self._group_rate:
+            return None
+
+        try:
+            if int(chat_id) > 0:
+                return None
+        except ValueError:
+            # Username of a channel or group
+            pass
+
+        bucket = self._buckets.get(chat_id)
+
+        if not bucket:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                for idle in [c for c, b in self._buckets.items() if b.is_full(now)]:
+                    del self._buckets[idle]
+
+            bucket = self._buckets[chat_id] = TokenBucket(self._group_rate, 1)
+
+        return bucket
+
+    def _next(self, now: float) -> Tuple[Tuple[Any, asyncio.Future] | None, float | None]:
+        """ Return first waiting request (by lane and age) whose chat is
+         allowed to receive a message. Otherwise return the seconds until
+         the next waiting request will be allowed (None if nothing waits) """
+
+        wait = None
+
+        for lane in self._lanes:
+            i = 0
+
+            while i < len(lane):
+                chat_id, future = lane[i]
+
+                # Caller isn't waiting anymore
+                if future.done():
+                    del lane[i]
+                    continue
+
+                bucket = self._get_bucket(chat_id, now)
+                delay = bucket.delay(now) if bucket else 0
+
+                if delay <= 0:
+                    del lane[i]
+                    return (chat_id, future), None
+
+                wait = delay if wait is None else min(wait, delay)
+                i += 1
+
+        return None, wait
+
+    async def _dispatch(self):
+        """ Release waiting requests as fast as the limits allow """
+
+        while True:
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._overall.delay(now) if self._overall else 0)
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            entry, wait = self._next(now)
+
+            if not entry:
+                self._wakeup.clear()
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            chat_id, future = entry
+
+            if self._overall:
+                self._overall.take(now)
+
+            bucket = self._get_bucket(chat_id, now)
+
+            if bucket:
+                bucket.take(now)
+
+            future.set_result(None)
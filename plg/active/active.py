@@ -1,14 +1,78 @@
+import time
+
+from typing import Dict, List, Tuple
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
 from plugin import TGBFPlugin
 from telegram import Update, Chat
 from telegram.ext import CallbackContext, MessageHandler, filters
 
 
+class LRUCache(OrderedDict):
+
+    def __init__(self, max_size: int):
+        """ Dict that keeps at most 'max_size' entries. Reading or
+         setting an entry makes it the most recently used one. If
+         the cache is full, the least recently used one is removed """
+
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
 class Active(TGBFPlugin):
 
     async def init(self):
-        if not await self.table_exists('active'):
-            sql = await self.get_resource('create_active.sql')
-            await self.exec_sql(sql)
+        # Activity rows that are not yet written to the database
+        self._rows = list()
+
+        # Existing partitions: table name -> (start date, end date)
+        self._partitions: Dict[str, Tuple[str, str]] = dict()
+
+        # Recently seen group and user metadata: ID -> (title, link) or user name.
+        # Filled from messages, metadata that isn't cached is written again
+        cache_size = self.cfg.get('metadata_cache_size') or 10_000
+        self._groups: LRUCache[int, Tuple[str, str]] = LRUCache(cache_size)
+        self._users: LRUCache[int, str] = LRUCache(cache_size)
+
+        # Recently active users per group: group ID -> user ID -> last seen (unix time)
+        self._recent: Dict[int, OrderedDict[int, float]] = dict()
+
+        # Changed group and user metadata that is not yet written to the database
+        self._changed_groups: Dict[int, Tuple[str, str]] = dict()
+        self._changed_users: Dict[int, str] = dict()
+
+        res = await self.exec_sql(await self.get_resource('select_partitions.sql'))
+        partitions = res['data'] if res['success'] else []
+
+        for name, start, end, rollup, dimensions in partitions:
+            self._partitions[name] = (start, end)
+
+            if not rollup:
+                await self.backfill_rollups(name)
+
+        # Newest partitions first so that the latest names are kept
+        for name, start, end, rollup, dimensions in sorted(partitions, key=lambda p: p[1], reverse=True):
+            if not dimensions:
+                async with self.transaction() as tx:
+                    await self.backfill_dimensions(tx, name)
+
+        await self.convert_legacy()
+
+        await self.load_recent()
 
         await self.add_handler(
             MessageHandler(
@@ -18,38 +82,381 @@ class Active(TGBFPlugin):
             )
         )
 
-        self.run_repeating(self.cleaner_callback, 86_400)
+        self._jobs = [
+            self.run_repeating(self.flush_callback, self.cfg.get('flush_interval') or 5),
+            self.run_repeating(self.cleaner_callback, 86_400)
+        ]
+
+    async def cleanup(self):
+        for job in self._jobs:
+            job.schedule_removal()
+
+        await self.flush()
 
     async def init_callback(self, update: Update, context: CallbackContext):
         try:
-            if update.message.chat.type == Chat.PRIVATE:
-                return
-
             c = update.effective_chat
             u = update.effective_user
             m = update.effective_message
 
+            if not c or c.type == Chat.PRIVATE:
+                return
             if not u:
                 return
             if u.is_bot:
                 return
 
-            await self.exec_sql(
-                await self.get_resource('insert_active.sql'),
+            user_name = '@' + u.username if u.username else u.first_name
+
+            # Only remember metadata if it changed since we last saw it
+            if self._groups.get(c.id) != (c.title, c.link):
+                self._groups[c.id] = self._changed_groups[c.id] = (c.title, c.link)
+            if self._users.get(u.id) != user_name:
+                self._users[u.id] = self._changed_users[u.id] = user_name
+
+            self.remember(c.id, u.id, time.time())
+
+            text = m.text if m.text else None
+
+            if text and self.cfg.get('store_text') is False:
+                text = None
+            elif text and self.cfg.get('max_text_length'):
+                text = text[:self.cfg.get('max_text_length')]
+
+            # In compact mode, metadata is only stored in 'groups' and 'users'
+            compact = self.cfg.get('compact')
+
+            self._rows.append((
                 c.id,
-                c.title,
-                c.link,
+                None if compact else c.title,
+                None if compact else c.link,
                 u.id,
-                '@' + u.username if u.username else u.first_name,
+                None if compact else user_name,
                 m.id,
                 len(m.text) if m.text else None,
-                m.text if m.text else None
-            )
+                text,
+                datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            ))
+
+            if len(self._rows) >= (self.cfg.get('flush_size') or 500):
+                await self.flush()
         except Exception as e:
             self.log.error(f'Can not save activity: {e} - UPDATE: {update}')
             await self.notify(e)
 
+    def get_partition(self, day: date) -> Tuple[str, str, str]:
+        """ Return table name, start date and end date (exclusive) of the
+        partition that contains the given day. Partitions cover the number
+        of days set as 'partition_days' in the config (1 = daily, 7 = weekly) """
+
+        days = self.cfg.get('partition_days') or 1
+
+        ordinal = day.toordinal()
+        start = date.fromordinal(ordinal - ((ordinal - 1) % days))
+        end = start + timedelta(days=days)
+
+        return f"active_{start.strftime('%Y%m%d')}", start.isoformat(), end.isoformat()
+
+    def get_partitions(self, since: datetime, until: datetime = None) -> List[str]:
+        """ Return names of all existing partitions that overlap the given time range """
+
+        since = since.strftime('%Y-%m-%d %H:%M:%S')
+        until = until.strftime('%Y-%m-%d %H:%M:%S') if until else None
+
+        return sorted(
+            name for name, (start, end) in self._partitions.items()
+            if end > since and (not until or start <= until)
+        )
+
+    async def create_partition(self, tx, name: str, start: str, end: str):
+        """ Create partition table with the given transaction and register it """
+
+        for resource in ('create_partition.sql', 'index_partition.sql', 'trigger_partition.sql'):
+            sql = (await self.get_resource(resource)).replace('{{table}}', name)
+            await tx.execute(sql)
+
+        await tx.execute(await self.get_resource('insert_partition.sql'), name, start, end)
+
+    async def backfill_rollups(self, name: str):
+        """ Build rollups for an existing partition and let the partition
+        maintain them by itself from now on. Rollups are updated by a
+        trigger at insert time, within the same transaction as the insert """
+
+        self.log.info(f"Building rollups for partition '{name}'...")
+
+        async with self.transaction() as tx:
+            for resource in ('backfill_rollups.sql', 'trigger_partition.sql'):
+                sql = (await self.get_resource(resource)).replace('{{table}}', name)
+                await tx.execute(sql)
+
+            await tx.execute(await self.get_resource('update_partition.sql'), name)
+
+    async def backfill_dimensions(self, tx, name: str):
+        """ Copy group and user metadata of an existing partition into
+        'groups' and 'users' with the given transaction. Entries that
+        already exist are kept, so newer partitions need to go first """
+
+        self.log.info(f"Copying group and user metadata of partition '{name}'...")
+
+        for resource in ('backfill_groups.sql', 'backfill_users.sql'):
+            sql = (await self.get_resource(resource)).replace('{{table}}', name)
+            await tx.execute(sql)
+
+        await tx.execute(await self.get_resource('update_partition_dimensions.sql'), name)
+
+    async def write(self, tx, rows) -> Dict[str, Tuple[str, str]]:
+        """ Write activity rows with the given transaction into the partitions
+        they belong to. Returns partitions that needed to be created """
+
+        partitions = dict()
+        created = dict()
+
+        for row in rows:
+            day = row[-1][:10]
+
+            if day not in partitions:
+                partitions[day] = (self.get_partition(date.fromisoformat(day)), list())
+
+            partitions[day][1].append(row)
+
+        for (name, start, end), partition_rows in partitions.values():
+            if name not in self._partitions and name not in created:
+                await self.create_partition(tx, name, start, end)
+                created[name] = (start, end)
+
+            sql = (await self.get_resource('insert_active.sql')).replace('{{table}}', name)
+            await tx.executemany(sql, partition_rows)
+
+        return created
+
+    async def flush(self):
+        """ Write changed group and user metadata and all
+        buffered activity rows in a single transaction """
+
+        if not self._rows and not self._changed_groups and not self._changed_users:
+            return
+
+        groups, self._changed_groups = self._changed_groups, dict()
+        users, self._changed_users = self._changed_users, dict()
+        rows, self._rows = self._rows, list()
+
+        try:
+            async with self.transaction() as tx:
+                if groups:
+                    await tx.executemany(
+                        await self.get_resource('upsert_group.sql'),
+                        [(group_id, title, link) for group_id, (title, link) in groups.items()])
+
+                if users:
+                    await tx.executemany(
+                        await self.get_resource('upsert_user.sql'),
+                        list(users.items()))
+
+                created = await self.write(tx, rows)
+        except Exception as e:
+            self.log.error(f'Can not save {len(rows)} activity rows: {e}')
+
+            # Metadata is only written on change, so keep it for the next try
+            self._changed_groups = groups | self._changed_groups
+            self._changed_users = users | self._changed_users
+
+            # Keep rows for the next try but don't let the buffer grow forever
+            max_buffer = self.cfg.get('max_buffer_size') or 10 * (self.cfg.get('flush_size') or 500)
+            self._rows = rows + self._rows
+
+            if len(self._rows) > max_buffer:
+                self.log.error(f'Activity buffer full: {len(self._rows) - max_buffer} oldest rows dropped')
+                self._rows = self._rows[-max_buffer:]
+
+            await self.notify(e)
+            return
+
+        for name, (start, end) in created.items():
+            self._partitions[name] = (start, end)
+            self.log.info(f"Partition '{name}' created")
+
+    async def flush_callback(self, context: CallbackContext):
+        await self.flush()
+
+    def remember(self, group_id: int, user_id: int, last_seen: float):
+        """ Add user to the in-memory index of recently active users. Users
+        that weren't active within 'recent_hours' or exceed 'recent_max_users'
+        per group (least recently active first) will be evicted """
+
+        users = self._recent.get(group_id)
+
+        if users is None:
+            users = self._recent[group_id] = OrderedDict()
+
+        users[user_id] = last_seen
+        users.move_to_end(user_id)
+
+        cutoff = last_seen - (self.cfg.get('recent_hours') or 24) * 3600
+        max_users = self.cfg.get('recent_max_users') or 10_000
+
+        while users:
+            oldest_id, oldest_seen = next(iter(users.items()))
+
+            if oldest_seen >= cutoff and len(users) <= max_users:
+                break
+
+            del users[oldest_id]
+
+    def get_recent_users(self, group_id: int, hours: float = None) -> List[Tuple[int, str]]:
+        """ Return (user ID, user name) of users that were active in the given
+        group within the last 'hours' hours, most recently active first. Answered
+        from memory without touching the database. The time window is limited
+        by 'recent_hours' from the config, which is also the default """
+
+        users = self._recent.get(group_id)
+
+        if not users:
+            return list()
+
+        cutoff = time.time() - (hours or self.cfg.get('recent_hours') or 24) * 3600
+
+        result = list()
+
+        for user_id in reversed(users):
+            if users[user_id] < cutoff:
+                break
+
+            result.append((user_id, self._users.get(user_id)))
+
+        return result
+
+    async def load_recent(self):
+        """ Fill in-memory index of recently active users from the database """
+
+        hours = self.cfg.get('recent_hours') or 24
+        since = datetime.utcnow() - timedelta(hours=hours)
+
+        partitions = self.get_partitions(since)
+
+        if not partitions:
+            return
+
+        select_sql = await self.get_resource('select_recent.sql')
+        sql = '\nUNION ALL\n'.join(select_sql.replace('{{table}}', p) for p in partitions)
+        sql = f"SELECT r.*, u.user_name FROM ({sql}) r LEFT JOIN users u USING (user_id) ORDER BY r.last_seen"
+
+        args = [since.strftime('%Y-%m-%d %H:%M:%S')] * len(partitions)
+
+        async for rows in self.exec_sql_iter(sql, *args):
+            for group_id, user_id, last_seen, user_name in rows:
+                seen = datetime.fromisoformat(last_seen).replace(tzinfo=timezone.utc)
+                self.remember(group_id, user_id, seen.timestamp())
+
+                # Names of recent users are needed for get_recent_users()
+                if user_name:
+                    self._users[user_id] = user_name
+
+    async def get_active_users(self, group_id: int, since: datetime) -> List[Tuple[int, str]]:
+        """ Return (user ID, user name) of all users that posted in
+        the given group since the given time. Only partitions that
+        overlap the time range will be queried """
+
+        partitions = self.get_partitions(since)
+
+        if not partitions:
+            return list()
+
+        select_sql = await self.get_resource('select_active.sql')
+        sql = '\nUNION\n'.join(select_sql.replace('{{table}}', p) for p in partitions)
+
+        args = [group_id, since.strftime('%Y-%m-%d %H:%M:%S')] * len(partitions)
+        res = await self.exec_sql(sql, *args)
+
+        return res['data'] if res['success'] else list()
+
+    async def get_leaderboard(self, group_id: int, days: int = 7, limit: int = 10) -> List[Tuple[int, str, int, int]]:
+        """ Return (user ID, user name, number of messages, number of characters) of the
+        most active users in the given group within the last 'days' days
+        (including today). Answered from rollups, not from raw messages """
+
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+        sql = await self.get_resource('select_leaderboard.sql')
+        res = await self.exec_sql(sql, group_id, since, limit)
+
+        return res['data'] if res['success'] else list()
+
+    async def get_user_activity(self, group_id: int, user_id: int, days: int = 7) -> List[Tuple[str, int, int]]:
+        """ Return (day, number of messages, number of characters) for every
+        day within the last 'days' days (including today) on which the
+        given user posted in the given group. Answered from rollups """
+
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+        sql = await self.get_resource('select_user_activity.sql')
+        res = await self.exec_sql(sql, group_id, user_id, since)
+
+        return res['data'] if res['success'] else list()
+
+    async def convert_legacy(self):
+        """ Move rows from the unpartitioned 'active' table into partitions """
+
+        if not await self.table_exists('active'):
+            return
+
+        created = dict()
+
+        try:
+            async with self.transaction() as tx:
+                # Another worker might have converted it in the meantime
+                if not await tx.fetch(await self.get_resource_global('table_exists.sql'), 'active'):
+                    for name, start, end, *_ in await tx.fetch(await self.get_resource('select_partitions.sql')):
+                        self._partitions[name] = (start, end)
+                    return
+
+                self.log.info("Moving activity data into partitions...")
+
+                async for rows in self.exec_sql_iter(await self.get_resource('select_legacy.sql')):
+                    created.update(await self.write(tx, rows))
+                    self._partitions.update(created)
+
+                # Legacy rows might have been written into existing partitions too
+                for name in sorted(self._partitions, key=lambda n: self._partitions[n][0], reverse=True):
+                    await self.backfill_dimensions(tx, name)
+
+                await tx.execute(await self.get_resource('drop_legacy.sql'))
+        except Exception:
+            for name in created:
+                del self._partitions[name]
+            raise
+
     async def cleaner_callback(self, context: CallbackContext):
-        sql = await self.get_resource('delete_active.sql')
-        sql = sql.replace('?', self.cfg.get('remove_after_days'))
-        await self.exec_sql(sql)
+        """ Drop whole partitions that are older than 'remove_after_days'.
+        Only the primary worker drops them in the database (including the
+        ones that other workers created), all others only forget them """
+
+        days = self.cfg.get('remove_after_days')
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+        partitions = dict(self._partitions)
+
+        if self.primary:
+            res = await self.exec_sql(await self.get_resource('select_partitions.sql'))
+
+            for name, start, end, *_ in res['data'] if res['success'] else []:
+                partitions[name] = (start, end)
+
+        for name, (start, end) in partitions.items():
+            if end > cutoff:
+                continue
+
+            if self.primary:
+                async with self.transaction() as tx:
+                    sql = (await self.get_resource('drop_partition.sql')).replace('{{table}}', name)
+                    await tx.execute(sql)
+                    await tx.execute(await self.get_resource('delete_partition.sql'), name)
+
+                self.log.info(f"Partition '{name}' removed")
+
+            self._partitions.pop(name, None)
+
+        rollup_days = self.cfg.get('rollup_remove_after_days')
+
+        if rollup_days and self.primary:
+            cutoff = (datetime.utcnow() - timedelta(days=rollup_days)).strftime('%Y-%m-%d')
+            await self.exec_sql(await self.get_resource('delete_rollups.sql'), cutoff)
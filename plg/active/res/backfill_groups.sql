@@ -0,0 +1,10 @@
+INSERT INTO groups (group_id, group_title, group_link)
+SELECT group_id, group_title, group_link
+FROM (
+    SELECT group_id, group_title, group_link, max(date_time)
+    FROM {{table}}
+    WHERE group_title IS NOT NULL
+    GROUP BY group_id
+)
+WHERE true
+ON CONFLICT (group_id) DO NOTHING
\ No newline at end of file
@@ -0,0 +1,8 @@
+INSERT INTO rollups (group_id, user_id, day, msg_count, msg_length)
+SELECT group_id, user_id, substr(date_time, 1, 10), count(*), sum(coalesce(msg_length, 0))
+FROM {{table}}
+WHERE true
+GROUP BY group_id, user_id, substr(date_time, 1, 10)
+ON CONFLICT (group_id, user_id, day) DO UPDATE SET
+    msg_count = excluded.msg_count,
+    msg_length = excluded.msg_length
\ No newline at end of file
@@ -0,0 +1,10 @@
+INSERT INTO users (user_id, user_name)
+SELECT user_id, user_name
+FROM (
+    SELECT user_id, user_name, max(date_time)
+    FROM {{table}}
+    WHERE user_name IS NOT NULL
+    GROUP BY user_id
+)
+WHERE true
+ON CONFLICT (user_id) DO NOTHING
\ No newline at end of file
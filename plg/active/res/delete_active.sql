@@ -1,2 +0,0 @@
-DELETE FROM active
-WHERE date_time <= date('now', '-? day')
\ No newline at end of file
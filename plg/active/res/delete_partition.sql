@@ -0,0 +1,2 @@
+DELETE FROM partitions
+WHERE name = ?
\ No newline at end of file
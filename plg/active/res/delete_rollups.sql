@@ -0,0 +1,2 @@
+DELETE FROM rollups
+WHERE day < ?
\ No newline at end of file
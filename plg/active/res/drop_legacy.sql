@@ -0,0 +1 @@
+DROP TABLE IF EXISTS active
\ No newline at end of file
@@ -0,0 +1 @@
+DROP TABLE IF EXISTS {{table}}
\ No newline at end of file
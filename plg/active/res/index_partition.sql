@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_{{table}}_group_date ON {{table}} (group_id, date_time)
\ No newline at end of file
@@ -1,2 +1,2 @@
-INSERT INTO active (group_id, group_title, group_link, user_id, user_name, msg_id, msg_length, msg_text)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?)
\ No newline at end of file
+INSERT INTO {{table}} (group_id, group_title, group_link, user_id, user_name, msg_id, msg_length, msg_text, date_time)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
\ No newline at end of file
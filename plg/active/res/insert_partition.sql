@@ -0,0 +1,2 @@
+INSERT OR IGNORE INTO partitions (name, start_date, end_date, rollup, dimensions)
+VALUES (?, ?, ?, 1, 1)
\ No newline at end of file
@@ -1,4 +1,4 @@
-CREATE TABLE active (
+CREATE TABLE IF NOT EXISTS active (
     group_id INTEGER,
     group_title TEXT,
     group_link TEXT,
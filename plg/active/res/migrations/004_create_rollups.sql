@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS rollups (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    msg_count INTEGER NOT NULL DEFAULT 0,
+    msg_length INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_id, user_id, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollups_group_day ON rollups (group_id, day);
+CREATE INDEX IF NOT EXISTS idx_rollups_day ON rollups (day);
+ALTER TABLE partitions ADD COLUMN rollup INTEGER NOT NULL DEFAULT 0
\ No newline at end of file
@@ -0,0 +1 @@
+ALTER TABLE partitions ADD COLUMN dimensions INTEGER NOT NULL DEFAULT 0
\ No newline at end of file
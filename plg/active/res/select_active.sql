@@ -1,3 +1,4 @@
-SELECT DISTINCT user_id, user_name
-FROM active
-WHERE group_id = ? AND date_time > ?
\ No newline at end of file
+SELECT DISTINCT a.user_id, coalesce(a.user_name, u.user_name)
+FROM {{table}} a
+LEFT JOIN users u ON u.user_id = a.user_id
+WHERE a.group_id = ? AND a.date_time > ?
\ No newline at end of file
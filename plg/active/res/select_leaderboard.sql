@@ -0,0 +1,7 @@
+SELECT r.user_id, u.user_name, sum(r.msg_count) AS messages, sum(r.msg_length) AS characters
+FROM rollups r
+LEFT JOIN users u ON u.user_id = r.user_id
+WHERE r.group_id = ? AND r.day >= ?
+GROUP BY r.user_id
+ORDER BY messages DESC
+LIMIT ?
\ No newline at end of file
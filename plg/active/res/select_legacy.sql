@@ -0,0 +1,3 @@
+SELECT group_id, group_title, group_link, user_id, user_name, msg_id, msg_length, msg_text, date_time
+FROM active
+ORDER BY rowid
\ No newline at end of file
@@ -0,0 +1,2 @@
+SELECT name, start_date, end_date, rollup, dimensions
+FROM partitions
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT group_id, user_id, max(date_time) AS last_seen
+FROM {{table}}
+WHERE date_time > ?
+GROUP BY group_id, user_id
\ No newline at end of file
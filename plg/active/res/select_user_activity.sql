@@ -0,0 +1,4 @@
+SELECT day, msg_count, msg_length
+FROM rollups
+WHERE group_id = ? AND user_id = ? AND day >= ?
+ORDER BY day
\ No newline at end of file
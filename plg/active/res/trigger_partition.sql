@@ -0,0 +1,9 @@
+CREATE TRIGGER IF NOT EXISTS trg_{{table}}_rollup
+AFTER INSERT ON {{table}}
+BEGIN
+    INSERT INTO rollups (group_id, user_id, day, msg_count, msg_length)
+    VALUES (NEW.group_id, NEW.user_id, substr(NEW.date_time, 1, 10), 1, coalesce(NEW.msg_length, 0))
+    ON CONFLICT (group_id, user_id, day) DO UPDATE SET
+        msg_count = msg_count + 1,
+        msg_length = msg_length + excluded.msg_length;
+END
\ No newline at end of file
@@ -0,0 +1,3 @@
+UPDATE partitions
+SET dimensions = 1
+WHERE name = ?
\ No newline at end of file
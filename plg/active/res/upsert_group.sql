@@ -0,0 +1,5 @@
+INSERT INTO groups (group_id, group_title, group_link)
+VALUES (?, ?, ?)
+ON CONFLICT (group_id) DO UPDATE SET
+    group_title = excluded.group_title,
+    group_link = excluded.group_link
\ No newline at end of file
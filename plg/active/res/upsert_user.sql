@@ -0,0 +1,4 @@
+INSERT INTO users (user_id, user_name)
+VALUES (?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    user_name = excluded.user_name
\ No newline at end of file
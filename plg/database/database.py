@@ -8,10 +8,6 @@ from telegram.ext import CallbackContext, CommandHandler
 class Database(TGBFPlugin):
 
     async def init(self):
-        if not await self.table_exists('test'):
-            sql = await self.get_resource("create_test.sql")
-            await self.exec_sql(sql)
-
         await self.add_handler(CommandHandler(self.handle, self.init_callback, block=False))
 
     @TGBFPlugin.send_typing
@@ -24,9 +20,15 @@ class Database(TGBFPlugin):
         data = context.args[1].lower()
 
         if sub_command == 'insert':
+            entries = [arg.lower() for arg in context.args[1:]]
+
             insert_sql = await self.get_resource('insert_test.sql')
-            await self.exec_sql(insert_sql, data)
-            await update.message.reply_text(f'{con.DONE} Inserted <b>{data}</b>')
+            sql_data = await self.exec_sql_many(insert_sql, [(e,) for e in entries])
+
+            if sql_data['success']:
+                await update.message.reply_text(f'{con.DONE} Inserted <b>{", ".join(entries)}</b>')
+            else:
+                await update.message.reply_text(f'{con.ERROR} Something bad happened')
 
         elif sub_command == 'select':
             if not data.isdigit():
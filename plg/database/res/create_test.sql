@@ -1,3 +0,0 @@
-CREATE TABLE test (
-    test TEXT NOT NULL
-)
\ No newline at end of file
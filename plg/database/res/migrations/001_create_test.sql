@@ -0,0 +1,3 @@
+CREATE TABLE IF NOT EXISTS test (
+    test TEXT NOT NULL
+)
\ No newline at end of file
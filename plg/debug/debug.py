@@ -44,7 +44,13 @@ class Debug(TGBFPlugin):
                   f"Total RAM: <code>{round(psutil.virtual_memory().total/1000000000, 2)} GB</code>\n" \
                   f"Available RAM: <code>{round(psutil.virtual_memory().available/1000000000, 2)} GB</code>\n" \
                   f"Used RAM: <code>{round(psutil.virtual_memory().used/1000000000, 2)} GB</code>\n" \
-                  f"RAM Usage: <code>{psutil.virtual_memory().percent}%</code>"
+                  f"RAM Usage: <code>{psutil.virtual_memory().percent}%</code>\n" \
+                  f"Resource cache: <code>{self.tgb.resources.stats}</code>\n" \
+                  f"Chat cache: <code>{self.tgb.chats.stats}</code>\n" \
+                  f"Router: <code>{self.tgb.router.stats}</code>\n" \
+                  f"Outbound: <code>{self.tgb.outbound.stats}</code>\n" \
+                  f"Concurrency: <code>{self.tgb.concurrency.stats}</code>\n" \
+                  f"Ordered chats: <code>{self.tgb.scheduler.stats}</code>"
 
             if self.is_private(update.message):
                 await update.message.reply_text(msg)
@@ -8,6 +8,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from plugin import TGBFPlugin
+from outbound import NOTIFY
 
 
 class Error(TGBFPlugin):
@@ -42,5 +43,6 @@ class Error(TGBFPlugin):
 
         # Finally, send the message
         await context.bot.send_message(
-            chat_id=self.cfg_global.get('admin_tg_id'), text=message, parse_mode=ParseMode.HTML
+            chat_id=self.cfg_global.get('admin_tg_id'), text=message, parse_mode=ParseMode.HTML,
+            rate_limit_args=NOTIFY
         )
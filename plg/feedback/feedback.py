@@ -8,10 +8,6 @@ from plugin import TGBFPlugin
 class Feedback(TGBFPlugin):
 
     async def init(self):
-        if not await self.table_exists("feedback"):
-            sql = await self.get_resource("create_feedback.sql")
-            await self.exec_sql(sql)
-
         await self.add_handler(CommandHandler(self.handle, self.init_callback, block=False))
 
     @TGBFPlugin.private
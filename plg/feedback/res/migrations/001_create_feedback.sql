@@ -1,4 +1,4 @@
-CREATE TABLE feedback (
+CREATE TABLE IF NOT EXISTS feedback (
     user_id INTEGER NOT NULL,
     first_name TEXT NOT NULL,
 	username TEXT,
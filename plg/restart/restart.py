@@ -10,6 +10,10 @@ class Restart(TGBFPlugin):
     async def init(self):
         await self.add_handler(CommandHandler(self.handle, self.init_callback, block=False))
 
+        # Only one worker edits the message and removes the saved data
+        if not self.primary:
+            return
+
         chat_id = self.cfg.get("chat_id")
         mess_id = self.cfg.get("message_id")
 
@@ -24,7 +24,11 @@ class Shutdown(TGBFPlugin):
         # TODO: Maybe use that?
         # os.kill(os.getpid(), signal.SIGTERM)
 
-        threading.Thread(target=asyncio.run, args=(self.shutdown_callback(),)).start()
+        if self.tgb.worker:
+            # Updates are received by the supervisor, which also stops all workers
+            self.tgb.worker.stop_bot()
+        else:
+            threading.Thread(target=asyncio.run, args=(self.shutdown_callback(),)).start()
 
     async def shutdown_callback(self):
         await self.tgb.bot.updater.stop()
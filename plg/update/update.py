@@ -46,7 +46,7 @@ class Update(TGBFPlugin):
             return
         if update.effective_user.id != int(self.cfg_global.get('admin_tg_id')):
             return
-        if (await context.bot.get_chat(update.message.chat_id)).type != telegram.Chat.PRIVATE:
+        if not self.is_private(update.message):
             return
 
         name = update.message.document.file_name
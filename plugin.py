@@ -1,21 +1,22 @@
 import os
-import sqlite3
+import time
 import inspect
-import asyncio
 
+import policy
+import outbound
 import constants as c
 import utils as utl
 
 from pathlib import Path
 from loguru import logger
-from functools import wraps
+from contextlib import asynccontextmanager
 from loguru._logger import Logger
 from typing import Tuple, Dict, Callable
-from telegram.constants import ChatAction
 from telegram import Chat, Update, Message
 from telegram.ext import CallbackContext, BaseHandler, Job
 from datetime import datetime, timedelta
 from config import ConfigManager
+from concurrency import Limiter
 from main import TelegramBot
 
 
@@ -31,8 +32,11 @@ class TGBFPlugin:
         # Set class name as name of this plugin
         self._name = type(self).__name__.lower()
 
-        # All bot handlers for this plugin
-        self._handlers: Dict[int, BaseHandler] = dict()
+        # All bot handlers for this plugin with their handler group
+        self._handlers: Dict[BaseHandler, int | None] = dict()
+
+        # Compiled access policies of decorated methods
+        self._policies: Dict[Callable, policy.Policy] = dict()
 
         # All endpoints of this plugin
         self._endpoints: Dict[str, Callable] = dict()
@@ -40,12 +44,29 @@ class TGBFPlugin:
         # Access to global config
         self._cfg_global = self._tgb.cfg
 
-        # Access to plugin config
-        self._cfg = ConfigManager(self.get_cfg_path() / self.get_cfg_name())
+        # Access to plugin config. Workers let the supervisor write changes
+        if self._tgb.worker:
+            self._cfg = self._tgb.worker.get_config(self.get_cfg_path() / self.get_cfg_name())
+        else:
+            self._cfg = ConfigManager(
+                self.get_cfg_path() / self.get_cfg_name(),
+                write_delay=self._cfg_global.get('cfg_write_delay') or 0)
+
+        # Concurrency limit for non-blocking handlers of this plugin
+        self._limiter = Limiter(self._name, self._cfg, parent=self._tgb.concurrency)
 
     async def __aenter__(self):
-        """ Executes init() method. Make sure to return 'self' if you override it """
+        """ Applies database migrations of the plugin and executes
+         init() method. Make sure to return 'self' if you override it """
+        await self.migrate()
         await self.init()
+
+        # Reload config files on change
+        if self.cfg_global.get('cfg_watch'):
+            self.cfg.subscribe(self.cfg_changed)
+            self.cfg_global.subscribe(self.cfg_changed)
+            self.cfg.watch()
+
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
@@ -61,6 +82,13 @@ class TGBFPlugin:
          before the plugin will be disabled """
         pass
 
+    async def cfg_changed(self, cfg: ConfigManager):
+        """ Overwrite this method if you want to react to changes of the
+         plugin config or the global config (given as 'cfg'). Only called
+         if 'cfg_watch' is enabled in the global config. New values are
+         already available through 'self.cfg' and 'self.cfg_global' """
+        pass
+
     @property
     def tgb(self) -> TelegramBot:
         return self._tgb
@@ -95,6 +123,14 @@ class TGBFPlugin:
         """ Return a list of all active plugins """
         return self.tgb.plugins
 
+    @property
+    def primary(self) -> bool:
+        """ Return True if the bot runs as single process or as primary
+         worker. Things that must only happen once even if several workers
+         run all plugins (maintenance jobs, editing a message on start
+         etc.) should only be done if this is True """
+        return not self.tgb.worker or self.tgb.worker.primary
+
     @property
     def jobs(self) -> Tuple[Job, ...]:
         """ Return a tuple with all currently active jobs """
@@ -111,37 +147,68 @@ class TGBFPlugin:
         return self._cfg
 
     @property
-    def handlers(self) -> Dict[int, BaseHandler]:
-        """ Return a list of bot handlers for this plugin """
+    def handlers(self) -> Dict[BaseHandler, int | None]:
+        """ Return all bot handlers of this plugin together with their
+         handler group (None for handlers added to the router) """
         return self._handlers
 
+    @property
+    def limiter(self) -> Limiter:
+        """ Return the concurrency limiter of this plugin """
+        return self._limiter
+
     @property
     def endpoints(self) -> Dict[str, Callable]:
         """ Return a list of bot endpoints for this plugin """
         return self._endpoints
 
-    async def add_handler(self, handler: BaseHandler, group: int = None):
-        """ Will add bot handlers to this plugins list of handlers
-         and also add them to the bot dispatcher """
+    async def add_handler(self, handler: BaseHandler, group: int = None, ordered: bool = False):
+        """ Will add bot handlers to this plugins list of handlers and also
+         add them to the bot. Without a group, the handler will be added to
+         the central router of the bot. Otherwise it's added to the given
+         handler group of the bot dispatcher. Set 'ordered' for non-blocking
+         handlers that need to process the updates of a chat one after
+         another and in the order they were received (router only) """
+
+        # Replace decorated callback with its compiled access policy
+        callback = getattr(handler, "callback", None)
+        func = getattr(callback, "__func__", None)
 
-        group = group if group else utl.md5(self.name, to_int=True)
+        if getattr(callback, "__self__", None) is self and policy.has_rules(func):
+            handler.callback = self.get_policy(func).run
 
-        self.tgb.bot.add_handler(handler, group)
-        self.handlers[group] = handler
+        if group is None:
+            self.tgb.router.add(handler, self.limiter, ordered)
+        else:
+            self.tgb.bot.add_handler(handler, group)
+
+        self.handlers[handler] = group
 
         self.log.info(f"Plugin '{self.name}': {type(handler).__name__} added")
 
     async def remove_handler(self, handler: BaseHandler):
         """ Removed the given handler from the bot """
 
-        for g, h in self.handlers.items():
-            if h == handler:
-                self.tgb.bot.remove_handler(h, g)
-                del self.handlers[g]
-                break
+        if handler not in self.handlers:
+            return
+
+        group = self.handlers.pop(handler)
+
+        if group is None:
+            self.tgb.router.remove(handler)
+        else:
+            self.tgb.bot.remove_handler(handler, group)
 
         self.log.info(f"Plugin '{self.name}': {type(handler).__name__} removed")
 
+    def get_policy(self, func: Callable) -> policy.Policy:
+        """ Return compiled access policy for a decorated method """
+
+        if func not in self._policies:
+            self._policies[func] = policy.Policy(self, func)
+
+        return self._policies[func]
+
     async def add_endpoint(self, name: str, action):
         """ Adds a webserver endpoint """
 
@@ -165,19 +232,27 @@ class TGBFPlugin:
         dict with '<placeholder>,<value>' entries then placeholders in
         the resource will be replaced with the corresponding <value>.
 
-        The placeholders need to be wrapped in double curly brackets
+        The placeholders need to be wrapped in double curly brackets.
+        The resource is compiled into a template only once and all
+        placeholders are then replaced in a single pass
         """
 
-        usage = await self.get_resource(f"{self.name}.txt")
+        path = os.path.join(self.get_res_path(), f"{self.name}.txt")
+
+        values = {"handle": self.handle}
 
-        if usage:
-            usage = usage.replace("{{handle}}", self.handle)
+        if replace:
+            for placeholder, value in replace.items():
+                values[placeholder.strip("{} ")] = value
 
-            if replace:
-                for placeholder, value in replace.items():
-                    usage = usage.replace(placeholder, str(value))
+        try:
+            template = await self.tgb.resources.get_template(path, values.keys())
+        except Exception as e:
+            self.log.error(e)
+            template = None
 
-            return usage
+        if template:
+            return template.render(values)
 
         await self.notify(f'No usage info for plugin <b>{self.name}</b>')
         return f'{c.ERROR} Could not retrieve usage info'
@@ -200,8 +275,7 @@ class TGBFPlugin:
         """ Return the content of the file in the given path """
 
         try:
-            with open(path, "r", encoding="utf8") as f:
-                return f.read()
+            return await self.tgb.resources.get(path)
         except Exception as e:
             self.log.error(e)
             await self.notify(e)
@@ -271,13 +345,7 @@ class TGBFPlugin:
         If database disabled:
         {"success": False, "data": "Database disabled"} """
 
-        if db_name:
-            if not db_name.lower().endswith(".db"):
-                db_name += ".db"
-        else:
-            db_name = c.FILE_DAT
-
-        db_path = Path.cwd() / c.DIR_DAT / db_name
+        db_path = self.get_db_path_global(db_name)
         return await self._exec_on_db(db_path, sql, *args)
 
     async def exec_sql(self, sql, *args, plugin="", db_name=""):
@@ -300,101 +368,284 @@ class TGBFPlugin:
         If database disabled:
         {"success": False, "data": "Database disabled"} """
 
-        if db_name:
-            if not db_name.lower().endswith(".db"):
-                db_name += ".db"
-        else:
-            if plugin:
-                db_name = plugin + ".db"
-            else:
-                db_name = self.name + ".db"
+        db_path = self.get_db_path(plugin, db_name)
+        return await self._exec_on_db(db_path, sql, *args)
 
-        plugin = plugin if plugin else self.name
-        db_path = Path(self.get_dat_path(plugin=plugin) / db_name)
+    async def exec_sql_attached(self, sql, *args, plugins=(), global_db=False, db_name=""):
+        """ Execute raw SQL statement on database of this plugin with
+        databases of other plugins attached so that data can be joined
+        in a single statement. Attached databases are read-only.
 
-        return await self._exec_on_db(db_path, sql, *args)
+        param: sql = the SQL query
+        param: *args = arguments for the SQL query
+        param: plugins = names of plugins whose databases will be
+        attached. Their tables are available as '<plugin>.<table>'
+        param: global_db = if TRUE, the global database will be
+        attached. Its tables are available as 'global.<table>'
+        param: db_name = name of DB in case it's not the
+        default (the name of the plugin)
+
+        Tables of this plugin are available as 'main.<table>'. Example:
+        SELECT f.user_id, count(*) FROM main.feedback f
+        JOIN active.rollups r ON r.user_id = f.user_id GROUP BY f.user_id
+
+        Following data will be returned
+        If error happens:
+        {"success": False, "data": None}
+
+        If no data available:
+        {"success": True, "data": None} """
+
+        attachments = {plugin: self.get_db_path(plugin) for plugin in plugins}
+
+        if global_db:
+            attachments["global"] = self.get_db_path_global()
+
+        db_path = self.get_db_path(db_name=db_name)
+
+        res = {"data": None, "success": None}
+
+        try:
+            res["data"] = await self.tgb.db.get(db_path).execute_attached(sql, args, attachments)
+            res["success"] = True
+        except Exception as e:
+            res["data"] = str(e)
+            res["success"] = False
+            self.log.error(e)
+            await self.notify(e)
+
+        return res
+
+    async def exec_sql_many_global(self, sql, rows, db_name="", chunk_size=1000):
+        """ Execute raw SQL statement on the global database
+        once for every entry in 'rows' and return the result
+
+        param: sql = the SQL query
+        param: rows = iterable or async iterable of argument tuples
+        param: db_name = name of the database file
+        param: chunk_size = number of rows to write before committing
+
+        Following data will be returned
+        If error happens:
+        {"success": False, "data": <error>}
+
+        If successful:
+        {"success": True, "data": {"rows": <affected rows>, "seconds": <elapsed>}} """
+
+        db_path = self.get_db_path_global(db_name)
+        return await self._exec_many_on_db(db_path, sql, rows, chunk_size)
+
+    async def exec_sql_many(self, sql, rows, plugin="", db_name="", chunk_size=1000):
+        """ Execute raw SQL statement on database for given plugin
+        once for every entry in 'rows' and return the result
+
+        param: sql = the SQL query
+        param: rows = iterable or async iterable of argument tuples
+        param: plugin = name of plugin that DB belongs too
+        param: db_name = name of DB in case it's not the
+        default (the name of the plugin)
+        param: chunk_size = number of rows to write before committing
+
+        Following data will be returned
+        If error happens:
+        {"success": False, "data": <error>}
+
+        If successful:
+        {"success": True, "data": {"rows": <affected rows>, "seconds": <elapsed>}} """
+
+        db_path = self.get_db_path(plugin, db_name)
+        return await self._exec_many_on_db(db_path, sql, rows, chunk_size)
+
+    async def _exec_many_on_db(self, db_path, sql, rows, chunk_size):
+        """ Execute SQL statement for all rows on pooled database connection """
+
+        res = {"data": None, "success": None}
+        start = time.perf_counter()
+
+        try:
+            count = await self.tgb.db.get(db_path).executemany(sql, rows, chunk_size)
+            res["data"] = {"rows": count, "seconds": time.perf_counter() - start}
+            res["success"] = True
+        except Exception as e:
+            res["data"] = str(e)
+            res["success"] = False
+            self.log.error(e)
+            await self.notify(e)
+
+        return res
+
+    async def exec_sql_global_iter(self, sql, *args, db_name="", chunk_size=500):
+        """ Execute raw SQL statement on the global database and
+        yield the result in chunks so that large results don't have
+        to be loaded into memory at once
+
+        param: sql = the SQL query
+        param: *args = arguments for the SQL query
+        param: db_name = name of the database file
+        param: chunk_size = max number of rows per chunk
+
+        Every chunk is a list of rows. If an error happens, the
+        admin will be notified and the exception will be raised """
+
+        db_path = self.get_db_path_global(db_name)
+
+        async for rows in self._iter_on_db(db_path, sql, *args, chunk_size=chunk_size):
+            yield rows
+
+    async def exec_sql_iter(self, sql, *args, plugin="", db_name="", chunk_size=500):
+        """ Execute raw SQL statement on database for given plugin
+        and yield the result in chunks so that large results don't
+        have to be loaded into memory at once
+
+        param: sql = the SQL query
+        param: *args = arguments for the SQL query
+        param: plugin = name of plugin that DB belongs too
+        param: db_name = name of DB in case it's not the
+        default (the name of the plugin)
+        param: chunk_size = max number of rows per chunk
+
+        Every chunk is a list of rows. If an error happens, the
+        admin will be notified and the exception will be raised """
+
+        db_path = self.get_db_path(plugin, db_name)
+
+        async for rows in self._iter_on_db(db_path, sql, *args, chunk_size=chunk_size):
+            yield rows
+
+    async def _iter_on_db(self, db_path, sql, *args, chunk_size=500):
+        """ Execute SQL statement on a pooled read connection and yield chunks """
+
+        try:
+            async for rows in self.tgb.db.get(db_path).iterate(sql, args, chunk_size):
+                yield rows
+        except Exception as e:
+            self.log.error(e)
+            await self.notify(e)
+            raise
 
     async def _exec_on_db(self, db_path, sql, *args):
-        """ Open database connection and execute SQL statement """
+        """ Execute SQL statement on pooled database connection """
 
         res = {"data": None, "success": None}
 
         try:
-            # Create directory if it doesn't exist
-            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            res["data"] = await self.tgb.db.get(db_path).execute(sql, args)
+            res["success"] = True
         except Exception as e:
             res["data"] = str(e)
             res["success"] = False
             self.log.error(e)
             await self.notify(e)
 
-        with sqlite3.connect(db_path, timeout=5) as con:
-            try:
-                cur = con.cursor()
-                cur.execute(sql, args)
-                con.commit()
+        return res
 
-                res["data"] = cur.fetchall()
-                res["success"] = True
+    def transaction_global(self, db_name=""):
+        """ Open a transaction on the global database. All statements
+        executed with the returned handle will be committed together
+        at the end of the block or rolled back if an error happens
 
-            except Exception as e:
-                res["data"] = str(e)
-                res["success"] = False
-                self.log.error(e)
-                await self.notify(e)
+        param: db_name = name of the database file
+
+        Usage:
+        async with self.transaction_global() as tx:
+            await tx.execute(sql, *args)
+            await tx.executemany(sql, rows)
+            rows = await tx.fetch(sql, *args) """
+
+        db_path = self.get_db_path_global(db_name)
+        return self._transaction_on_db(db_path)
+
+    def transaction(self, plugin="", db_name=""):
+        """ Open a transaction on database for given plugin. All
+        statements executed with the returned handle will be committed
+        together at the end of the block or rolled back if an error happens
+
+        param: plugin = name of plugin that DB belongs too
+        param: db_name = name of DB in case it's not the
+        default (the name of the plugin)
+
+        Usage:
+        async with self.transaction() as tx:
+            await tx.execute(sql, *args)
+            await tx.executemany(sql, rows)
+            rows = await tx.fetch(sql, *args) """
 
-            return res
+        db_path = self.get_db_path(plugin, db_name)
+        return self._transaction_on_db(db_path)
+
+    @asynccontextmanager
+    async def _transaction_on_db(self, db_path):
+        """ Open transaction on pooled database connection """
+
+        try:
+            async with self.tgb.db.get(db_path).transaction() as tx:
+                yield tx
+        except Exception as e:
+            self.log.error(e)
+            await self.notify(e)
+            raise
 
     async def table_exists_global(self, table_name, db_name="") -> bool:
         """ Return TRUE if given table exists in global database, otherwise FALSE """
 
-        if db_name:
-            if not db_name.lower().endswith(".db"):
-                db_name += ".db"
-        else:
-            db_name = c.FILE_DAT
-
-        db_path = Path(Path.cwd() / c.DIR_DAT / db_name)
+        db_path = self.get_db_path_global(db_name)
         return await self._db_table_exists(db_path, table_name)
 
     async def table_exists(self, table_name, plugin=None, db_name=None) -> bool:
         """ Return TRUE if given table exists in given plugin, otherwise FALSE """
 
-        if db_name:
-            if not db_name.lower().endswith(".db"):
-                db_name += ".db"
-        else:
-            if plugin:
-                db_name = plugin + ".db"
-            else:
-                db_name = self.name + ".db"
-
-        plugin = plugin if plugin else self.name
-        db_path = Path(self.get_dat_path(plugin=plugin) / db_name)
-
+        db_path = self.get_db_path(plugin, db_name)
         return await self._db_table_exists(db_path, table_name)
 
     async def _db_table_exists(self, db_path, table_name) -> bool:
-        """ Open connection to database and check if given table exists """
+        """ Check on pooled database connection if given table exists """
 
         if not db_path.is_file():
             return False
 
-        con = sqlite3.connect(db_path)
-        cur = con.cursor()
-        exists = False
-
         statement = await self.get_resource_global("table_exists.sql")
 
         try:
-            if cur.execute(statement, [table_name]).fetchone():
-                exists = True
+            return bool(await self.tgb.db.get(db_path).execute(statement, [table_name]))
         except Exception as e:
             self.log.error(e)
             await self.notify(e)
+            return False
+
+    async def migrate(self, plugin=None, db_name=None) -> int:
+        """ Apply all migrations from the 'res/migrations' folder of the
+        given plugin to its database and return the schema version.
+
+        Migrations are SQL files named 'NNN_<description>.sql' where
+        NNN is the version number. Every migration will only be applied
+        once. The current version is stored as 'user_version' in the
+        database file itself. New tables and indexes should always be
+        added with a new migration instead of editing an existing one """
+
+        mig_path = Path(self.get_res_path(plugin) / c.DIR_MIG)
+
+        if not mig_path.is_dir():
+            return 0
 
-        con.close()
-        return exists
+        migrations = list()
+
+        for file in mig_path.glob(f"*{c.SQL_EXT}"):
+            number = file.name.split("_")[0]
+
+            if not number.isdigit():
+                self.log.warning(f"Plugin '{self.name}': Migration '{file.name}' ignored")
+                continue
+
+            migrations.append((int(number), file))
+
+        db_path = self.get_db_path(plugin, db_name)
+
+        try:
+            return await self.tgb.db.get(db_path).migrate(migrations)
+        except Exception as e:
+            self.log.error(f"Plugin '{self.name}': Migration failed: {e}")
+            await self.notify(e)
+            raise
 
     def get_res_path(self, plugin=None) -> Path:
         """ Return path of resource directory for given plugin """
@@ -416,6 +667,32 @@ class TGBFPlugin:
         plugin = plugin if plugin else self.name
         return Path(c.DIR_PLG, plugin, c.DIR_DAT)
 
+    def get_db_path(self, plugin=None, db_name=None) -> Path:
+        """ Return path of database file for given plugin. If no
+        'db_name' is provided, the name of the plugin will be used """
+
+        plugin = plugin if plugin else self.name
+
+        if db_name:
+            if not db_name.lower().endswith(c.DAT_EXT):
+                db_name += c.DAT_EXT
+        else:
+            db_name = plugin + c.DAT_EXT
+
+        return Path(self.get_dat_path(plugin=plugin) / db_name)
+
+    def get_db_path_global(self, db_name=None) -> Path:
+        """ Return path of global database file. If no 'db_name'
+        is provided, the default global database will be used """
+
+        if db_name:
+            if not db_name.lower().endswith(c.DAT_EXT):
+                db_name += c.DAT_EXT
+        else:
+            db_name = c.FILE_DAT
+
+        return Path(Path.cwd() / c.DIR_DAT / db_name)
+
     def get_plg_path(self, plugin=None) -> Path:
         """ Return path of given plugin directory """
         plugin = plugin if plugin else self.name
@@ -434,6 +711,11 @@ class TGBFPlugin:
         """ Check if message was sent in a private chat or not """
         return message.chat.type == Chat.PRIVATE
 
+    async def get_chat(self, update: Update, context: CallbackContext) -> Chat | None:
+        """ Return chat of the given update. Taken from the update
+        itself if possible, otherwise from cache or the Telegram API """
+        return await self.tgb.chats.resolve(context.bot, update)
+
     async def remove_msg_after(self, *messages: Message, after_secs):
         """ Remove a Telegram message after a given time """
 
@@ -443,7 +725,7 @@ class TGBFPlugin:
             msg_id = int(param_lst[1])
 
             try:
-                await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
+                await context.bot.delete_message(chat_id=chat_id, message_id=msg_id, rate_limit_args=outbound.LOW)
             except Exception as e:
                 self.log.error(f"Not possible to remove message: {e}")
 
@@ -462,7 +744,7 @@ class TGBFPlugin:
         admin = self.cfg_global.get('admin_tg_id')
 
         try:
-            await self.tgb.bot.updater.bot.send_message(admin, f"{c.ALERT} {msg}")
+            await self.tgb.bot.updater.bot.send_message(admin, f"{c.ALERT} {msg}", rate_limit_args=outbound.NOTIFY)
         except Exception as e:
             error = f"Not possible to notify admin id '{admin}'"
             self.log.error(f"{error}: {e}")
@@ -473,39 +755,12 @@ class TGBFPlugin:
     @classmethod
     def private(cls, func):
         """ Decorator for methods that need to be run in a private chat with the bot """
-
-        @wraps(func)
-        async def _private(self, update: Update, context: CallbackContext, **kwargs):
-            if (await context.bot.get_chat(update.effective_chat.id)).type == Chat.PRIVATE:
-                if asyncio.iscoroutinefunction(func):
-                    return await func(self, update, context, **kwargs)
-                else:
-                    return func(self, update, context, **kwargs)
-
-            if update.message:
-                name = context.bot.username if context.bot.username else context.bot.name
-                msg = f"{c.ERROR} Use this command in a chat with the bot @{name}"
-                await update.message.reply_text(msg)
-
-        return _private
+        return policy.add_rule(func, policy.PRIVATE)
 
     @classmethod
     def public(cls, func):
         """ Decorator for methods that need to be run in a public group """
-
-        @wraps(func)
-        async def _public(self, update: Update, context: CallbackContext, **kwargs):
-            if (await context.bot.get_chat(update.effective_chat.id)).type != Chat.PRIVATE:
-                if asyncio.iscoroutinefunction(func):
-                    return await func(self, update, context, **kwargs)
-                else:
-                    return func(self, update, context, **kwargs)
-
-            if update.message:
-                msg = f"{c.ERROR} Can only be used in a public chat"
-                await update.message.reply_text(msg)
-
-        return _public
+        return policy.add_rule(func, policy.PUBLIC)
 
     @classmethod
     def owner(cls, func):
@@ -516,115 +771,29 @@ class TGBFPlugin:
         list of the global config file 'global.cfg' or in the ["admins"] list
         of the currently used plugin config file.
         """
-
-        @wraps(func)
-        async def _owner(self, update: Update, context: CallbackContext, **kwargs):
-            user_id = update.effective_user.id
-
-            plg_admins = self.cfg.get("admins")
-            plg_admins = plg_admins if isinstance(plg_admins, list) else []
-
-            global_admin = self.cfg_global.get("admin_tg_id")
-
-            if user_id in plg_admins or user_id == global_admin:
-                if asyncio.iscoroutinefunction(func):
-                    return await func(self, update, context, **kwargs)
-                else:
-                    return func(self, update, context, **kwargs)
-
-        return _owner
+        return policy.add_rule(func, policy.OWNER)
 
     @classmethod
     def dependency(cls, func):
         """ Decorator that executes a method only if the mentioned
         plugins in the config file of the current plugin are enabled """
-
-        @wraps(func)
-        async def _dependency(self, update: Update, context: CallbackContext, **kwargs):
-            dependencies = self.cfg.get("dependency")
-            dependencies = dependencies if isinstance(dependencies, list) else []
-
-            for dependency in dependencies:
-                if dependency.lower() not in self.plugins:
-                    msg = f"{c.ERROR} Plugin '{self.name}' is missing dependency '{dependency}'"
-                    await update.message.reply_text(msg)
-                    return
-
-            if asyncio.iscoroutinefunction(func):
-                return await func(self, update, context, **kwargs)
-            else:
-                return func(self, update, context, **kwargs)
-
-        return _dependency
+        return policy.add_rule(func, policy.DEPENDENCY)
 
     @classmethod
     def send_typing(cls, func):
         """ Decorator for sending typing notification in the Telegram chat """
-
-        @wraps(func)
-        async def _send_typing(self, update, context, **kwargs):
-            # Make sure that edited messages will not trigger any functionality
-            if not update.edited_message:
-                try:
-                    await context.bot.send_chat_action(
-                        chat_id=update.effective_chat.id,
-                        action=ChatAction.TYPING)
-                except:
-                    pass
-
-            if asyncio.iscoroutinefunction(func):
-                return await func(self, update, context, **kwargs)
-            else:
-                return func(self, update, context, **kwargs)
-
-        return _send_typing
+        return policy.add_rule(func, policy.TYPING)
 
     @classmethod
     def blacklist(cls, func):
         """ Decorator to check whether a command can be executed in the given
          chat or not. If the current chat ID is part of the 'blacklist' list
          in the plugins config file then the command will not be executed. """
-
-        @wraps(func)
-        async def _blacklist(self, update: Update, context: CallbackContext, **kwargs):
-            blacklist_chats = self.cfg.get("blacklist")
-
-            try:
-                if blacklist_chats and (update.effective_chat.id not in blacklist_chats):
-                    if asyncio.iscoroutinefunction(func):
-                        return await func(self, update, context, **kwargs)
-                    else:
-                        return func(self, update, context, **kwargs)
-            except:
-                pass
-
-            name = context.bot.username if context.bot.username else context.bot.name
-            msg = self.cfg.get("blacklist_msg").replace("{{name}}", name)
-            await update.message.reply_text(msg, disable_web_page_preview=True)
-
-        return _blacklist
+        return policy.add_rule(func, policy.BLACKLIST)
 
     @classmethod
     def whitelist(cls, func):
         """ Decorator to check whether a command can be executed in the given
          chat or not. If the current chat ID is part of the 'whitelist' list
          in the plugins config file then the command will be executed. """
-
-        @wraps(func)
-        async def _whitelist(self, update: Update, context: CallbackContext, **kwargs):
-            whitelist_chats = self.cfg.get("whitelist")
-
-            try:
-                if whitelist_chats and (update.effective_chat.id in whitelist_chats):
-                    if asyncio.iscoroutinefunction(func):
-                        return await func(self, update, context, **kwargs)
-                    else:
-                        return func(self, update, context, **kwargs)
-            except:
-                pass
-
-            name = context.bot.username if context.bot.username else context.bot.name
-            msg = self.cfg.get("whitelist_msg").replace("{{name}}", name)
-            await update.message.reply_text(msg, disable_web_page_preview=True)
-
-        return _whitelist
+        return policy.add_rule(func, policy.WHITELIST)
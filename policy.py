@@ -0,0 +1,180 @@
+import asyncio
+import constants as c
+
+from functools import wraps
+from typing import Callable
+from telegram import Chat, Update
+from telegram.ext import CallbackContext
+
+OWNER = "owner"
+PRIVATE = "private"
+PUBLIC = "public"
+DEPENDENCY = "dependency"
+BLACKLIST = "blacklist"
+WHITELIST = "whitelist"
+TYPING = "send_typing"
+
+
+def add_rule(func: Callable, rule: str) -> Callable:
+    """ Add an access rule to the given plugin method. The method is
+     wrapped only once, no matter how many rules are stacked on it.
+     Rules are evaluated by a Policy that is compiled for the method
+     when it's added as handler callback with TGBFPlugin.add_handler() """
+
+    if getattr(func, "__policy_wrapper__", None) is not func:
+        original = func
+
+        @wraps(original)
+        async def _policy(plugin, update: Update, context: CallbackContext, **kwargs):
+            # Method was called directly and not as handler callback
+            return await plugin.get_policy(_policy).run(update, context, **kwargs)
+
+        _policy.__policy_wrapper__ = _policy
+        _policy.__policy_func__ = original
+        _policy.__policy_rules__ = set()
+        func = _policy
+
+    func.__policy_rules__.add(rule)
+    return func
+
+
+def has_rules(func: Callable) -> bool:
+    """ Return True if access rules were added to the given method """
+    return getattr(func, "__policy_wrapper__", None) is func
+
+
+class Policy:
+
+    def __init__(self, plugin, wrapper: Callable):
+        """ Access rules of a single plugin method, compiled into one
+         check. Admins and chat lists are read from the config once and
+         kept as frozensets. They are compiled again as soon as the plugin
+         config or the global config got a new snapshot (changed values
+         or reloaded file) so that a check is a single set lookup """
+
+        self._plugin = plugin
+        self._func = wrapper.__policy_func__
+        self._is_async = asyncio.iscoroutinefunction(self._func)
+
+        rules = frozenset(wrapper.__policy_rules__)
+
+        self._owner = OWNER in rules
+        self._private = PRIVATE in rules
+        self._public = PUBLIC in rules
+        self._dependency = DEPENDENCY in rules
+        self._blacklist = BLACKLIST in rules
+        self._whitelist = WHITELIST in rules
+        self._typing = TYPING in rules
+
+        # Snapshots of plugin and global config the policy was compiled for
+        self._cfg = None
+        self._cfg_global = None
+
+        self._admins = frozenset()
+        self._blacklist_chats = frozenset()
+        self._whitelist_chats = frozenset()
+        self._dependencies = tuple()
+
+        self.compile()
+
+    def compile(self):
+        """ Read admins, chat lists and dependencies from the config """
+
+        cfg = self._plugin.cfg
+        cfg_global = self._plugin.cfg_global
+
+        self._cfg = cfg.get()
+        self._cfg_global = cfg_global.get()
+
+        admins = cfg.get("admins")
+        admins = admins if isinstance(admins, list) else []
+
+        global_admin = cfg_global.get("admin_tg_id")
+
+        self._admins = frozenset(admins + [global_admin] if global_admin else admins)
+        self._blacklist_chats = frozenset(cfg.get("blacklist") or [])
+        self._whitelist_chats = frozenset(cfg.get("whitelist") or [])
+
+        dependencies = cfg.get("dependency")
+        dependencies = dependencies if isinstance(dependencies, list) else []
+
+        self._dependencies = tuple(d.lower() for d in dependencies)
+
+    async def run(self, update: Update, context: CallbackContext, **kwargs):
+        """ Execute the method if all access rules are fulfilled """
+
+        plugin = self._plugin
+
+        if plugin.cfg.get() is not self._cfg or plugin.cfg_global.get() is not self._cfg_global:
+            self.compile()
+
+        if self._owner:
+            user = update.effective_user
+
+            if not user or user.id not in self._admins:
+                return
+
+        if self._blacklist:
+            chat = update.effective_chat
+
+            if chat and chat.id in self._blacklist_chats:
+                await self._reply_list_msg(update, context, "blacklist_msg")
+                return
+
+        if self._whitelist:
+            chat = update.effective_chat
+
+            if not chat or chat.id not in self._whitelist_chats:
+                await self._reply_list_msg(update, context, "whitelist_msg")
+                return
+
+        if self._dependency:
+            for dependency in self._dependencies:
+                if dependency not in plugin.plugins:
+                    if update.message:
+                        msg = f"{c.ERROR} Plugin '{plugin.name}' is missing dependency '{dependency}'"
+                        await update.message.reply_text(msg)
+                    return
+
+        if self._private or self._public:
+            chat = await plugin.get_chat(update, context)
+
+            if self._private and not (chat and chat.type == Chat.PRIVATE):
+                if update.message:
+                    name = context.bot.username if context.bot.username else context.bot.name
+                    msg = f"{c.ERROR} Use this command in a chat with the bot @{name}"
+                    await update.message.reply_text(msg)
+                return
+
+            if self._public and not (chat and chat.type != Chat.PRIVATE):
+                if update.message:
+                    msg = f"{c.ERROR} Can only be used in a public chat"
+                    await update.message.reply_text(msg)
+                return
+
+        chat_id = None
+
+        # Make sure that edited messages will not trigger the typing action
+        if self._typing and not update.edited_message and update.effective_chat:
+            chat_id = update.effective_chat.id
+
+            # Typing action is sent in the background while the method runs
+            plugin.tgb.typing.start(context.bot, chat_id)
+
+        try:
+            if self._is_async:
+                return await self._func(plugin, update, context, **kwargs)
+            else:
+                return self._func(plugin, update, context, **kwargs)
+        finally:
+            if chat_id is not None:
+                plugin.tgb.typing.stop(chat_id)
+
+    async def _reply_list_msg(self, update: Update, context: CallbackContext, key: str):
+        """ Reply with the configured message for blocked chats """
+
+        msg = self._plugin.cfg.get(key)
+
+        if msg and update.message:
+            name = context.bot.username if context.bot.username else context.bot.name
+            await update.message.reply_text(msg.replace("{{name}}", name), disable_web_page_preview=True)
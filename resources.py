@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import asyncio
+
+from pathlib import Path
+from loguru import logger
+from typing import Dict, Iterable
+
+
+class Template:
+
+    # Placeholders are wrapped in double curly brackets: {{name}}
+    PLACEHOLDER = re.compile(r"{{\s*(\w+)\s*}}")
+
+    def __init__(self, text: str, names: Iterable[str] = None):
+        """ Text with placeholders, compiled once into a list of segments.
+         Even indices hold literal text and odd indices hold placeholder
+         names so that rendering is a single join. If the 'names' of the
+         values that will be rendered are given, placeholders without a
+         value are detected and logged once while compiling """
+
+        self._segments = self.PLACEHOLDER.split(text)
+        self._names = frozenset(self._segments[1::2])
+
+        # Text of every segment as it is in the template, used for placeholders without value
+        self._raw = [f"{{{{{s}}}}}" if i & 1 else s for i, s in enumerate(self._segments)]
+
+        if names is not None:
+            self.validate(names)
+
+    @property
+    def placeholders(self) -> frozenset:
+        """ Return names of all placeholders in this template """
+        return self._names
+
+    def validate(self, names: Iterable[str]) -> frozenset:
+        """ Return (and log) placeholders that have no value in 'names' """
+
+        missing = self._names.difference(names)
+
+        if missing:
+            logger.warning(f"No value for placeholders {sorted(missing)}")
+
+        return missing
+
+    def render(self, values: Dict[str, str]) -> str:
+        """ Replace placeholders with the given values. Placeholders
+         without a value will be kept as they are in the text """
+
+        raw = self._raw
+
+        return "".join([
+            str(values.get(s, raw[i])) if i & 1 else s
+            for i, s in enumerate(self._segments)
+        ])
+
+
+class Resource:
+
+    __slots__ = ("content", "mtime", "checked", "template")
+
+    def __init__(self, content: str, mtime: float, checked: float):
+        """ Cached content of a resource file together with its
+         modification time, the time it was last checked and the
+         compiled template (only compiled once it's needed) """
+
+        self.content = content
+        self.mtime = mtime
+        self.checked = checked
+        self.template = None
+
+
+class ResourceCache:
+
+    def __init__(self, check_interval: float = 5):
+        """ Keeps the content of resource files in memory. A cached file
+         will be checked for modifications at most every 'check_interval'
+         seconds and reloaded if its mtime changed. Any disk access is
+         done in a worker thread and never on the event loop """
+
+        self._check_interval = check_interval
+        self._resources: Dict[str, Resource] = dict()
+
+        # Requests answered from memory
+        self.hits = 0
+        # Requests that needed to read the file
+        self.misses = 0
+        # Requests that needed to check the mtime of the file
+        self.checks = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Return hit / miss counters and number of cached files """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "checks": self.checks,
+            "cached": len(self._resources)
+        }
+
+    def _load(self, key: str, resource: Resource | None) -> Resource:
+        """ Reload file if it changed. Runs in a worker thread """
+
+        mtime = os.stat(key).st_mtime
+
+        if resource and resource.mtime == mtime:
+            resource.checked = time.monotonic()
+            return resource
+
+        with open(key, "r", encoding="utf8") as f:
+            content = f.read()
+
+        self.misses += 1
+        return Resource(content, mtime, time.monotonic())
+
+    async def _get(self, path: Path | str) -> Resource:
+        """ Return cached resource for given file """
+
+        key = os.path.abspath(path)
+        resource = self._resources.get(key)
+
+        if resource and time.monotonic() - resource.checked < self._check_interval:
+            self.hits += 1
+            return resource
+
+        if resource:
+            self.checks += 1
+
+        self._resources[key] = await asyncio.to_thread(self._load, key, resource)
+        return self._resources[key]
+
+    async def get(self, path: Path | str) -> str:
+        """ Return content of given file """
+        return (await self._get(path)).content
+
+    async def get_template(self, path: Path | str, names: Iterable[str] = None) -> Template:
+        """ Return content of given file compiled as template. The template
+         is cached together with the content and recompiled if it changes.
+         Placeholders that aren't in 'names' are logged when compiling """
+
+        resource = await self._get(path)
+
+        if not resource.template:
+            resource.template = Template(resource.content, names)
+
+        return resource.template
+
+    def invalidate(self, path: Path | str = None):
+        """ Remove given file or all files in the given directory
+         from the cache. Without a path, the whole cache is cleared """
+
+        if path is None:
+            self._resources.clear()
+            return
+
+        key = os.path.abspath(path)
+        prefix = key + os.sep
+
+        for cached in [k for k in self._resources if k == key or k.startswith(prefix)]:
+            del self._resources[cached]
+
+        logger.debug(f"Resource cache invalidated for '{key}'")
@@ -0,0 +1,159 @@
+import asyncio
+
+from typing import Dict, List, Set
+from concurrency import Limiter
+from scheduler import ChatScheduler
+from telegram import Update, MessageEntity
+from telegram.ext import Application, ApplicationHandlerStop, BaseHandler, CallbackContext, CommandHandler, TypeHandler
+
+
+class Router:
+
+    def __init__(self, application: Application, limiter: Limiter, scheduler: ChatScheduler):
+        """ Dispatches updates to the handlers of all plugins through a
+         single handler that is registered with the bot. The command of
+         an update is parsed once and looked up in a dict of commands so
+         that only the handlers for that command are checked. All other
+         handlers (message filters etc.) are checked on a separate path.
+         Dispatch cost doesn't grow with the number of command plugins.
+         Non-blocking handlers are started through the concurrency limiter
+         of their plugin or the given global limiter. Ordered handlers are
+         executed through the scheduler, one update per chat at a time """
+
+        self._application = application
+        self._limiter = limiter
+        self._scheduler = scheduler
+
+        # Command -> command handlers of all plugins
+        self._commands: Dict[str, List[CommandHandler]] = dict()
+        # Handlers that aren't command handlers
+        self._filters: List[BaseHandler] = list()
+        # Handler -> limiter for non-blocking handlers
+        self._limiters: Dict[BaseHandler, Limiter] = dict()
+        # Non-blocking handlers that process updates of a chat in order
+        self._ordered: Set[BaseHandler] = set()
+
+        self._handler = TypeHandler(Update, self._dispatch)
+
+    @property
+    def handler(self) -> TypeHandler:
+        """ Return the handler that needs to be added to the bot """
+        return self._handler
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Return number of routed commands and filter handlers """
+
+        return {
+            "commands": len(self._commands),
+            "filters": len(self._filters)
+        }
+
+    def add(self, handler: BaseHandler, limiter: Limiter = None, ordered: bool = False):
+        """ Route updates to given handler. Non-blocking handlers will be
+         limited by the given limiter or by the global one. If 'ordered' is
+         set, updates of the same chat are handled one after another in the
+         order they were received while different chats run in parallel """
+
+        self._limiters[handler] = limiter or self._limiter
+
+        if ordered:
+            self._ordered.add(handler)
+
+        if isinstance(handler, CommandHandler):
+            for command in handler.commands:
+                self._commands.setdefault(command, list()).append(handler)
+        else:
+            self._filters.append(handler)
+
+    def remove(self, handler: BaseHandler):
+        """ Stop routing updates to given handler """
+
+        self._limiters.pop(handler, None)
+        self._ordered.discard(handler)
+
+        if isinstance(handler, CommandHandler):
+            for command in handler.commands:
+                handlers = self._commands.get(command, [])
+
+                if handler in handlers:
+                    handlers.remove(handler)
+                if not handlers:
+                    self._commands.pop(command, None)
+        elif handler in self._filters:
+            self._filters.remove(handler)
+
+    @staticmethod
+    def get_command(update: Update) -> str | None:
+        """ Return command (without leading slash and bot name) that the
+         message of the given update starts with or None if there is none """
+
+        message = update.effective_message
+
+        if not message or not message.text or not message.entities:
+            return None
+
+        entity = message.entities[0]
+
+        if entity.type != MessageEntity.BOT_COMMAND or entity.offset != 0:
+            return None
+
+        return message.text[1:entity.length].split("@", 1)[0].lower()
+
+    async def _dispatch(self, update: Update, context: CallbackContext):
+        """ Run all handlers that match the given update """
+
+        command = self.get_command(update)
+
+        handlers = self._commands.get(command, []) if command else []
+
+        if self._filters:
+            handlers = handlers + self._filters
+
+        for handler in handlers:
+            try:
+                check = handler.check_update(update)
+            except Exception as e:
+                await self._application.process_error(update, e)
+                continue
+
+            if check is None or check is False:
+                continue
+
+            if handler.block:
+                try:
+                    await handler.handle_update(update, self._application, check, context)
+                except ApplicationHandlerStop:
+                    break
+                except Exception as e:
+                    await self._application.process_error(update, e)
+            elif handler in self._ordered and update.effective_chat:
+                # Queued right away so that the order of updates is kept
+                self._scheduler.submit(
+                    update.effective_chat.id,
+                    self._handle_limited(self._limiters[handler], handler, update, check, context))
+            else:
+                self._limiters[handler].submit(self._handle(handler, update, check, context))
+
+    async def _handle_limited(self, limiter: Limiter, handler: BaseHandler, update: Update, check, context: CallbackContext):
+        """ Run non-blocking handler through its limiter and wait until
+         it's finished (or dropped by the limiter) """
+
+        finished = asyncio.get_running_loop().create_future()
+
+        def done():
+            if not finished.done():
+                finished.set_result(None)
+
+        limiter.submit(self._handle(handler, update, check, context), done)
+        await finished
+
+    async def _handle(self, handler: BaseHandler, update: Update, check, context: CallbackContext):
+        """ Run non-blocking handler and pass errors to the error handlers """
+
+        try:
+            await handler.handle_update(update, self._application, check, context)
+        except ApplicationHandlerStop:
+            pass
+        except Exception as e:
+            await self._application.process_error(update, e)
@@ -0,0 +1,95 @@
+import asyncio
+
+from collections import deque
+from loguru import logger
+from typing import Any, Coroutine, Deque, Dict
+
+
+class KeyedQueue:
+
+    __slots__ = ("items", "wakeup", "task")
+
+    def __init__(self):
+        """ Waiting coroutines of one key and the task that executes them """
+
+        self.items: Deque[Coroutine] = deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+
+class ChatScheduler:
+
+    def __init__(self, idle_timeout: float = 60):
+        """ Executes coroutines in the order they were submitted for the
+         same key (chat ID) while coroutines of different keys run in
+         parallel. Every key gets its own queue and task. A queue that was
+         empty for 'idle_timeout' seconds is removed together with its task """
+
+        self._idle_timeout = idle_timeout
+        self._queues: Dict[Any, KeyedQueue] = dict()
+
+        # Coroutines executed
+        self.processed = 0
+        # Queues removed because they were idle
+        self.evicted = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Return number of queues, waiting coroutines and counters """
+
+        return {
+            "queues": len(self._queues),
+            "waiting": sum(len(q.items) for q in self._queues.values()),
+            "processed": self.processed,
+            "evicted": self.evicted
+        }
+
+    def submit(self, key: Any, coro: Coroutine):
+        """ Execute coroutine after all coroutines that were submitted
+         before for the same key. Doesn't wait for the execution """
+
+        queue = self._queues.get(key)
+
+        if not queue:
+            queue = self._queues[key] = KeyedQueue()
+            queue.task = asyncio.create_task(self._work(key, queue))
+
+        queue.items.append(coro)
+        queue.wakeup.set()
+
+    async def _work(self, key: Any, queue: KeyedQueue):
+        """ Execute coroutines of a queue one after another """
+
+        try:
+            while True:
+                while queue.items:
+                    try:
+                        await queue.items.popleft()
+                    except Exception as e:
+                        logger.error(f"Ordered execution for '{key}' failed: {e}")
+
+                    self.processed += 1
+
+                queue.wakeup.clear()
+
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), self._idle_timeout)
+                except asyncio.TimeoutError:
+                    if not queue.items:
+                        self.evicted += 1
+                        break
+        finally:
+            if self._queues.get(key) is queue:
+                del self._queues[key]
+
+            # Don't leave coroutines behind that were never awaited
+            while queue.items:
+                queue.items.popleft().close()
+
+    async def close(self):
+        """ Stop all queues. Waiting coroutines won't be executed """
+
+        for queue in list(self._queues.values()):
+            queue.task.cancel()
+
+        self._queues.clear()
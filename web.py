@@ -1,8 +1,10 @@
+import hmac
 import uvicorn
 
 from pathlib import Path
-from fastapi import FastAPI, APIRouter
-from starlette.responses import FileResponse
+from loguru import logger
+from fastapi import FastAPI, APIRouter, Request
+from starlette.responses import FileResponse, Response
 
 
 class WebAppWrapper:
@@ -43,3 +45,32 @@ class WebAppWrapper:
                     self.app.routes.remove(route)
                 else:
                     self.router.routes.remove(route)
+
+    def add_webhook(self, path: str, callback, secret_token: str):
+        """ Add route that receives updates from Telegram via POST. Requests
+         need to contain the 'secret_token' in the header
+         'X-Telegram-Bot-Api-Secret-Token', otherwise anybody could post
+         forged updates. The JSON content of every update is given to the
+         async 'callback' """
+
+        if not secret_token:
+            raise ValueError("Webhook needs a secret token")
+
+        async def webhook(request: Request):
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+
+            if not hmac.compare_digest(token.encode(), secret_token.encode()):
+                return Response(status_code=403)
+
+            try:
+                await callback(await request.json())
+            except Exception as e:
+                logger.warning(f"Webhook received invalid update: {e}")
+                return Response(status_code=400)
+
+            return Response(status_code=200)
+
+        if self.app:
+            self.app.add_api_route(path, webhook, methods=["POST"], include_in_schema=False)
+        else:
+            self.router.add_api_route(path, webhook, methods=["POST"], include_in_schema=False)
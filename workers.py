@@ -0,0 +1,841 @@
+import httpx
+import pickle
+import signal
+import asyncio
+import threading
+import multiprocessing
+
+import constants as con
+
+from pathlib import Path
+from loguru import logger
+from typing import Any, Dict
+from contextlib import asynccontextmanager
+from telegram import Bot, Update
+from config import ConfigManager
+from db import Database, DatabasePool
+from web import WebAppWrapper
+
+# Sent through a queue to stop the receiving side
+SHUTDOWN = None
+
+# Methods of TelegramBot that workers can broadcast to all other workers
+BROADCASTS = ("enable_plugin", "disable_plugin")
+
+# Config changes that workers send to the supervisor and that are applied in all workers
+CONFIG_CHANGES = ("set_config", "remove_config")
+
+# Sent by a worker to let the supervisor stop the bot
+STOP = "stop"
+
+# Update fields that contain the chat an update belongs to
+CHAT_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "my_chat_member", "chat_member", "chat_join_request",
+    "message_reaction", "message_reaction_count", "chat_boost", "removed_chat_boost"
+)
+
+
+def get_chat_id(data: Dict[str, Any]) -> int:
+    """ Return the ID of the chat a raw update (JSON) belongs to. Falls back
+     to the ID of the user for updates without a chat (inline queries etc.) """
+
+    for field in CHAT_FIELDS:
+        value = data.get(field)
+
+        if isinstance(value, dict) and isinstance(value.get("chat"), dict):
+            return value["chat"].get("id", 0)
+
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+
+        # Callback queries contain the message the button belongs to
+        if isinstance(value.get("message"), dict) and isinstance(value["message"].get("chat"), dict):
+            return value["message"]["chat"].get("id", 0)
+
+        if isinstance(value.get("from"), dict):
+            return value["from"].get("id", 0)
+
+    return 0
+
+
+class DatabaseServer:
+
+    def __init__(
+            self,
+            pool: DatabasePool,
+            requests: multiprocessing.Queue,
+            responses: Dict[int, multiprocessing.Queue],
+            tx_timeout: float = 60):
+        """ Executes database requests of all worker processes on the given
+         pool, so that there is only a single process writing to the SQLite
+         files. Requests are read on a separate thread and executed on the
+         event loop, every request in its own task. Open transactions keep
+         their database locked until the worker commits or rolls back. A
+         transaction without any request for 'tx_timeout' seconds is rolled
+         back, and release() rolls back all transactions of a worker whose
+         process ended so that the database doesn't stay locked. Responses
+         are sent to the queue of the worker ID in 'responses'. Every worker
+         process needs its own ID, also if it replaces a stopped one """
+
+        self._pool = pool
+        self._requests = requests
+        self._responses = responses
+        self._tx_timeout = tx_timeout
+
+        self._loop = None
+        self._thread = None
+
+        # Transaction ID -> (worker, context manager, transaction handle, timeout handle)
+        self._transactions: Dict[int, tuple] = dict()
+        self._tx_counter = 0
+
+    def start(self):
+        """ Start reading requests """
+
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._read, name="db-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop reading requests """
+
+        self._requests.put(SHUTDOWN)
+        self._thread.join()
+
+    def _read(self):
+        """ Hand over requests to the event loop. Runs on the reader thread """
+
+        while (data := self._requests.get()) is not SHUTDOWN:
+            asyncio.run_coroutine_threadsafe(self._handle(*pickle.loads(data)), self._loop)
+
+    async def _handle(self, worker: int, request_id: int, method: str, path: Path, args: tuple):
+        """ Execute request and send result (or exception) back to the worker """
+
+        try:
+            if method == "begin":
+                # Transactions belong to the worker that opened them
+                args = (worker,)
+
+            result = await getattr(self, f"_{method}")(self._pool.get(path), *args)
+            response = (request_id, True, result)
+        except Exception as e:
+            response = (request_id, False, e)
+
+        # Queues pickle in a background thread and silently drop what can't
+        # be pickled, so it's done here to always send something back
+        try:
+            data = pickle.dumps(response)
+
+            # Some exceptions can be pickled but not unpickled
+            if not response[1]:
+                pickle.loads(data)
+        except Exception as e:
+            error = RuntimeError(f"Result of '{method}' can't be sent to worker: {repr(response[2])} ({repr(e)})")
+            data = pickle.dumps((request_id, False, error))
+
+        # Worker might have stopped in the meantime
+        if worker in self._responses:
+            self._responses[worker].put(data)
+
+    async def _execute(self, database: Database, sql, args):
+        return await database.execute(sql, args)
+
+    async def _execute_attached(self, database: Database, sql, args, attachments):
+        return await database.execute_attached(sql, args, attachments)
+
+    async def _executemany(self, database: Database, sql, rows, chunk_size):
+        return await database.executemany(sql, rows, chunk_size)
+
+    async def _migrate(self, database: Database, migrations):
+        return await database.migrate(migrations)
+
+    async def _begin(self, database: Database, worker: int):
+        context = database.transaction()
+        tx = await context.__aenter__()
+
+        self._tx_counter += 1
+        tx_id = self._tx_counter
+
+        timeout = self._loop.call_later(self._tx_timeout, self._expire, tx_id)
+        self._transactions[tx_id] = (worker, context, tx, timeout)
+        return tx_id
+
+    def _get_tx(self, tx_id: int):
+        """ Return handle of open transaction and restart its timeout """
+
+        if tx_id not in self._transactions:
+            raise RuntimeError(f"Transaction {tx_id} isn't open anymore")
+
+        worker, context, tx, timeout = self._transactions[tx_id]
+
+        timeout.cancel()
+        timeout = self._loop.call_later(self._tx_timeout, self._expire, tx_id)
+        self._transactions[tx_id] = (worker, context, tx, timeout)
+        return tx
+
+    async def _end(self, tx_id: int, error: Exception = None):
+        """ Commit transaction or roll it back if an error is given """
+
+        if tx_id not in self._transactions:
+            raise RuntimeError(f"Transaction {tx_id} isn't open anymore")
+
+        _, context, _, timeout = self._transactions.pop(tx_id)
+        timeout.cancel()
+
+        if error:
+            await context.__aexit__(type(error), error, None)
+        else:
+            await context.__aexit__(None, None, None)
+
+    def _expire(self, tx_id: int):
+        """ Roll back transaction that wasn't used for too long """
+
+        worker = self._transactions[tx_id][0]
+        logger.warning(f"Transaction {tx_id} of worker {worker} timed out: Rolling back")
+
+        error = RuntimeError(f"Transaction timed out after {self._tx_timeout} seconds")
+        asyncio.create_task(self._end(tx_id, error))
+
+    async def release(self, worker: int):
+        """ Roll back all open transactions of given worker """
+
+        for tx_id in [t for t, (w, *_) in self._transactions.items() if w == worker]:
+            logger.warning(f"Transaction {tx_id} of worker {worker} still open: Rolling back")
+            await self._end(tx_id, RuntimeError(f"Worker {worker} stopped"))
+
+    async def _tx_execute(self, database: Database, tx_id, sql, args):
+        return await self._get_tx(tx_id).execute(sql, *args)
+
+    async def _tx_executemany(self, database: Database, tx_id, sql, rows):
+        return await self._get_tx(tx_id).executemany(sql, rows)
+
+    async def _tx_fetch(self, database: Database, tx_id, sql, args):
+        return await self._get_tx(tx_id).fetch(sql, *args)
+
+    async def _commit(self, database: Database, tx_id):
+        await self._end(tx_id)
+
+    async def _rollback(self, database: Database, tx_id):
+        # Might already be rolled back because of a timeout
+        if tx_id in self._transactions:
+            await self._end(tx_id, RuntimeError("Transaction rolled back by worker"))
+
+
+class DatabaseClient:
+
+    def __init__(self, worker: int, requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+        """ Sends database requests of a worker process to the DatabaseServer
+         and resolves the pending futures once the responses arrive. The
+         'worker' ID needs to be unique for every worker process """
+
+        self._worker = worker
+        self._requests = requests
+        self._responses = responses
+
+        self._loop = None
+        self._thread = None
+
+        self._pending: Dict[int, asyncio.Future] = dict()
+        self._counter = 0
+
+    def start(self):
+        """ Start reading responses """
+
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._read, name="db-client", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop reading responses """
+
+        self._responses.put(SHUTDOWN)
+        self._thread.join()
+
+    def _read(self):
+        """ Hand over responses to the event loop. Runs on the reader thread """
+
+        while (data := self._responses.get()) is not SHUTDOWN:
+            self._loop.call_soon_threadsafe(self._resolve, *pickle.loads(data))
+
+    def _resolve(self, request_id: int, success: bool, result):
+        future = self._pending.pop(request_id, None)
+
+        if not future or future.done():
+            return
+
+        if success:
+            future.set_result(result)
+        else:
+            future.set_exception(result)
+
+    async def call(self, method: str, path: Path, *args):
+        """ Execute method of DatabaseServer and return its result """
+
+        # Raises right away if arguments can't be pickled instead of
+        # being dropped silently by the queue
+        self._counter += 1
+        data = pickle.dumps((self._worker, self._counter, method, path, args))
+
+        future = self._loop.create_future()
+        self._pending[self._counter] = future
+
+        self._requests.put(data)
+        return await future
+
+
+class RemoteTransaction:
+
+    def __init__(self, client: DatabaseClient, path: Path, tx_id: int):
+        """ Handle for a transaction that is open in the writer process """
+
+        self._client = client
+        self._path = path
+        self._tx_id = tx_id
+
+    async def execute(self, sql, *args) -> int:
+        """ Execute SQL statement and return the number of affected rows """
+        return await self._client.call("tx_execute", self._path, self._tx_id, sql, args)
+
+    async def executemany(self, sql, rows) -> int:
+        """ Execute SQL statement for every row and return the number of affected rows """
+        return await self._client.call("tx_executemany", self._path, self._tx_id, sql, [tuple(r) for r in rows])
+
+    async def fetch(self, sql, *args) -> list:
+        """ Execute SQL statement and return all resulting rows """
+        return await self._client.call("tx_fetch", self._path, self._tx_id, sql, args)
+
+
+class RemoteDatabase:
+
+    def __init__(self, client: DatabaseClient, path: Path, busy_timeout: int, mmap_size: int):
+        """ Same interface as Database, but statements are executed by the
+         writer process. Only streaming reads with iterate() are done with
+         a local read-only connection since readers don't block in WAL mode.
+         Like Database, statements outside of the transaction handle raise
+         right away if the current task has a transaction open, instead of
+         waiting for a lock in the writer process that it holds itself """
+
+        self._client = client
+        self._path = path
+        self._local = Database(path, busy_timeout, mmap_size)
+
+        # Task that has a transaction open
+        self._tx_task = None
+
+    async def _call(self, method: str, *args):
+        """ Execute method of DatabaseServer for this database """
+
+        if self._tx_task and self._tx_task is asyncio.current_task():
+            raise RuntimeError(f"Use the transaction handle while a transaction on '{self._path}' is open")
+
+        return await self._client.call(method, self._path, *args)
+
+    @property
+    def path(self) -> Path:
+        """ Return the path of the database file """
+        return self._path
+
+    async def execute(self, sql, args=()) -> list:
+        """ Execute SQL statement and return all resulting rows """
+        return await self._call("execute", sql, tuple(args))
+
+    async def execute_attached(self, sql, args=(), attachments: Dict[str, Path] = None) -> list:
+        """ Execute SQL statement with other databases attached read-only """
+        return await self._call("execute_attached", sql, tuple(args), attachments)
+
+    async def executemany(self, sql, rows, chunk_size: int = 0) -> int:
+        """ Execute SQL statement for every row and return the number of affected rows """
+
+        if hasattr(rows, "__aiter__"):
+            rows = [tuple(r) async for r in rows]
+        else:
+            rows = [tuple(r) for r in rows]
+
+        return await self._call("executemany", sql, rows, chunk_size)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """ Open a transaction in the writer process and return a handle """
+
+        if self._tx_task and self._tx_task is asyncio.current_task():
+            raise RuntimeError(f"Transaction on '{self._path}' is already open")
+
+        tx_id = await self._client.call("begin", self._path)
+        self._tx_task = asyncio.current_task()
+
+        try:
+            yield RemoteTransaction(self._client, self._path, tx_id)
+            await self._client.call("commit", self._path, tx_id)
+        except BaseException:
+            await self._client.call("rollback", self._path, tx_id)
+            raise
+        finally:
+            self._tx_task = None
+
+    async def migrate(self, migrations) -> int:
+        """ Apply migrations that haven't been applied yet """
+        return await self._call("migrate", list(migrations))
+
+    async def iterate(self, sql, args=(), chunk_size: int = 500):
+        """ Execute SQL statement and yield the resulting rows in chunks """
+
+        async for rows in self._local.iterate(sql, args, chunk_size):
+            yield rows
+
+    async def close(self):
+        """ Close local read-only connections """
+        await self._local.close()
+
+
+class RemoteDatabasePool:
+
+    def __init__(self, client: DatabaseClient, busy_timeout: int = 5000, mmap_size: int = 268_435_456):
+        """ Same interface as DatabasePool for worker processes """
+
+        self._client = client
+        self._busy_timeout = busy_timeout
+        self._mmap_size = mmap_size
+
+        self._databases: Dict[Path, RemoteDatabase] = dict()
+
+    def get(self, path: Path | str) -> RemoteDatabase:
+        """ Return database for given path """
+
+        path = Path(path).resolve()
+
+        if path not in self._databases:
+            self._databases[path] = RemoteDatabase(self._client, path, self._busy_timeout, self._mmap_size)
+
+        return self._databases[path]
+
+    async def close(self):
+        """ Close all local connections and stop the client """
+
+        for database in self._databases.values():
+            await database.close()
+
+        self._databases.clear()
+        self._client.stop()
+
+
+class RemoteConfigManager(ConfigManager):
+
+    def __init__(self, config_file, worker: "Worker"):
+        """ ConfigManager of a worker process. Changes are applied to the
+         own snapshot right away and sent to the supervisor, which writes
+         them into the file and applies them in all workers in the order
+         it received them. So workers never overwrite each other's changes
+         with outdated snapshots and all end up with the same config """
+
+        super().__init__(config_file)
+
+        self._worker = worker
+        self._key = str(Path(config_file).resolve())
+
+    @property
+    def key(self) -> str:
+        """ Return the resolved path of the config file """
+        return self._key
+
+    def _save(self, cfg: dict):
+        """ Only swap in new snapshot. The supervisor writes the file """
+
+        self._snapshot = (cfg, dict())
+        self._version += 1
+
+    def flush(self):
+        """ Nothing to write. Changes were sent to the supervisor already """
+        pass
+
+    def set(self, value, *keys):
+        super().set(value, *keys)
+
+        if keys:
+            self._worker.broadcast("set_config", self._key, value, keys)
+
+    def remove(self, *keys):
+        super().remove(*keys)
+
+        if keys:
+            self._worker.broadcast("remove_config", self._key, keys)
+
+    def apply(self, method: str, *args):
+        """ Apply change that was sent by the supervisor """
+
+        if method == "set_config":
+            value, keys = args
+            super().set(value, *keys)
+        elif method == "remove_config":
+            keys, = args
+            super().remove(*keys)
+
+
+class Worker:
+
+    def __init__(
+            self,
+            index: int,
+            count: int,
+            inbox: multiprocessing.Queue,
+            broadcasts: multiprocessing.Queue,
+            db: RemoteDatabasePool = None):
+        """ Context of a worker process. Worker 0 is the primary one
+         that sends the start message and runs the webserver. Besides
+         updates, the inbox contains broadcasts of other workers and
+         config changes that the supervisor applied """
+
+        self.index = index
+        self.count = count
+        self.inbox = inbox
+        self.broadcasts = broadcasts
+        self.db = db
+
+        # Resolved path -> config of this worker
+        self.configs: Dict[str, RemoteConfigManager] = dict()
+
+        self.stopped = asyncio.Event()
+
+    @property
+    def primary(self) -> bool:
+        return self.index == 0
+
+    def get_config(self, config_file) -> RemoteConfigManager:
+        """ Return config for given file that sends changes to the supervisor """
+
+        config = RemoteConfigManager(config_file, self)
+        self.configs[config.key] = config
+        return config
+
+    def broadcast(self, method: str, *args):
+        """ Let all other workers execute given method of their TelegramBot
+         (enabling or disabling a plugin) so that all run the same plugins.
+         Config changes are written by the supervisor and applied in all
+         workers, including this one """
+
+        if method not in BROADCASTS + CONFIG_CHANGES:
+            raise ValueError(f"Method '{method}' can't be broadcast")
+
+        self.broadcasts.put((self.index, method, args))
+
+    def stop_bot(self):
+        """ Let the supervisor stop receiving updates and stop all workers """
+        self.broadcasts.put((self.index, STOP, ()))
+
+    async def feed(self, tgb):
+        """ Put received updates into the update queue of the given bot in
+         the order they were received until the supervisor stops the worker.
+         Broadcasts are executed in between, in the order they arrived.
+
+         Updates are taken out of the inbox one at a time, so that all
+         others stay in the inbox if the worker stops unexpectedly and are
+         handled in order by the restarted worker. Delivery is at most once:
+         the update that was taken last (and updates that are still being
+         handled) are lost if the worker process dies """
+
+        application = tgb.bot
+
+        while True:
+            data = await asyncio.to_thread(self.inbox.get)
+
+            if data is SHUTDOWN:
+                self.stopped.set()
+                return
+
+            if isinstance(data, tuple):
+                method, args = data
+
+                try:
+                    if method in CONFIG_CHANGES:
+                        # Config of a plugin that is disabled in this worker is ignored
+                        if args[0] in self.configs:
+                            self.configs[args[0]].apply(method, *args[1:])
+                    else:
+                        await getattr(tgb, method)(*args, broadcast=False)
+                except Exception as e:
+                    logger.error(f"Worker {self.index} can't execute broadcast '{method}': {e}")
+                continue
+
+            try:
+                await application.update_queue.put(Update.de_json(data, application.bot))
+            except Exception as e:
+                logger.error(f"Worker {self.index} can't decode update: {e}")
+
+
+def run_worker(index: int, count: int, token: str, inbox, broadcasts, requests, responses, worker_id: int):
+    """ Entry point of a worker process """
+
+    import main
+
+    # Supervisor stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    main.init_logging(f"worker-{index}")
+
+    async def run():
+        worker = Worker(index, count, inbox, broadcasts)
+        config = worker.get_config(con.DIR_CFG / con.FILE_CFG)
+
+        client = DatabaseClient(worker_id, requests, responses)
+        client.start()
+
+        worker.db = RemoteDatabasePool(
+            client,
+            busy_timeout=config.get('database', 'busy_timeout') or 5000,
+            mmap_size=config.get('database', 'mmap_size') or 268_435_456
+        )
+
+        await main.TelegramBot().run(config, token, worker)
+
+    asyncio.run(run())
+
+
+class Supervisor:
+
+    def __init__(self, config: ConfigManager, token: str, count: int):
+        """ Receives updates (polling or webhook) and distributes them to
+         'count' worker processes that each run all plugins. Updates are
+         sharded by chat ID so that all updates of a chat are handled by
+         the same worker in the order they were received. All database
+         writes of the workers are executed by this process. Workers that
+         stopped unexpectedly are restarted and take over their inbox """
+
+        self._cfg = config
+        self._token = token
+        self._count = count
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._requests = None
+        self._db_server = None
+
+        # Broadcasts of workers and the thread that relays them
+        self._broadcasts = None
+        self._relay_thread = None
+
+        # Set to stop receiving updates (signal or request of a worker)
+        self._loop = None
+        self._stop = None
+
+        self._inboxes = list()
+        self._processes = list()
+
+        # Worker ID of the process at every index and response queue per worker ID
+        self._worker_ids = list()
+        self._responses: Dict[int, multiprocessing.Queue] = dict()
+        self._worker_counter = 0
+
+    def _shard(self, chat_id: int, data: Dict[str, Any]):
+        """ Send update to the worker responsible for the chat """
+        self._inboxes[chat_id % self._count].put(data)
+
+    async def _shard_raw(self, data: Dict[str, Any]):
+        """ Shard update that was received as JSON without decoding it """
+        self._shard(get_chat_id(data), data)
+
+    async def _poll(self, bot: Bot, timeout: int = 30):
+        """ Receive updates with long polling. Updates are taken from the
+         JSON response of 'getUpdates' and sharded without decoding them
+         into Update objects, the workers do that """
+
+        offset = None
+
+        async with httpx.AsyncClient(timeout=timeout + 10) as client:
+            while True:
+                try:
+                    response = await client.post(f"{bot.base_url}/getUpdates", json={
+                        "offset": offset,
+                        "timeout": timeout,
+                        "allowed_updates": Update.ALL_TYPES
+                    })
+
+                    result = response.json()
+
+                    if not result.get("ok"):
+                        raise RuntimeError(result.get("description"))
+                except Exception as e:
+                    logger.error(f"Polling for updates failed: {repr(e)}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for data in result["result"]:
+                    offset = data["update_id"] + 1
+                    await self._shard_raw(data)
+
+    def _start_worker(self, index: int):
+        """ Start worker process for given index with a new worker ID """
+
+        self._worker_counter += 1
+        worker_id = self._worker_counter
+
+        self._responses[worker_id] = self._ctx.Queue()
+
+        process = self._ctx.Process(
+            target=run_worker,
+            args=(index, self._count, self._token, self._inboxes[index], self._broadcasts,
+                  self._requests, self._responses[worker_id], worker_id),
+            name=f"worker-{index}")
+
+        process.start()
+
+        self._processes[index] = process
+        self._worker_ids[index] = worker_id
+
+    def _relay(self):
+        """ Send broadcasts of a worker to all other workers. Config changes
+         are written into the file here and sent to all workers, so that
+         all apply them in the same order. Runs on the relay thread """
+
+        while (broadcast := self._broadcasts.get()) is not SHUTDOWN:
+            sender, method, args = broadcast
+
+            if method == STOP:
+                logger.info(f"Worker {sender} requested to stop the bot")
+                self._loop.call_soon_threadsafe(self._stop.set)
+                continue
+
+            if method in CONFIG_CHANGES:
+                self._write_config(method, *args)
+
+            for index, inbox in enumerate(self._inboxes):
+                if index != sender or method in CONFIG_CHANGES:
+                    inbox.put((method, args))
+
+    @staticmethod
+    def _write_config(method: str, config_file: str, *args):
+        """ Apply config change of a worker to the file. The file is read
+         again every time so that changes done by hand are kept """
+
+        config = ConfigManager(config_file)
+
+        if method == "set_config":
+            value, keys = args
+            config.set(value, *keys)
+        else:
+            keys, = args
+            config.remove(*keys)
+
+    async def _stopped(self, index: int):
+        """ Clean up after the worker process at given index stopped """
+
+        worker_id = self._worker_ids[index]
+
+        # Don't leave databases locked by transactions the worker didn't finish
+        await self._db_server.release(worker_id)
+        self._responses.pop(worker_id, None)
+
+    async def _monitor(self, interval: float):
+        """ Restart worker processes that stopped unexpectedly """
+
+        while True:
+            await asyncio.sleep(interval)
+
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+
+                logger.error(f"Worker '{process.name}' stopped with exit code {process.exitcode}: Restarting")
+
+                await self._stopped(index)
+                self._start_worker(index)
+
+    async def run(self):
+        if self._cfg.get('webhook', 'enabled') and not self._cfg.get('webhook', 'secret_token'):
+            logger.error("Webhook enabled but no 'secret_token' configured")
+            return
+
+        self._inboxes = [self._ctx.Queue() for _ in range(self._count)]
+        self._processes = [None] * self._count
+        self._worker_ids = [None] * self._count
+
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+
+        self._requests = self._ctx.Queue()
+        self._broadcasts = self._ctx.Queue()
+
+        self._relay_thread = threading.Thread(target=self._relay, name="relay", daemon=True)
+        self._relay_thread.start()
+
+        # Single writer for all SQLite databases
+        db = DatabasePool(
+            busy_timeout=self._cfg.get('database', 'busy_timeout') or 5000,
+            mmap_size=self._cfg.get('database', 'mmap_size') or 268_435_456
+        )
+
+        self._db_server = DatabaseServer(
+            db,
+            self._requests,
+            self._responses,
+            tx_timeout=self._cfg.get('workers', 'tx_timeout') or 60
+        )
+        self._db_server.start()
+
+        for index in range(self._count):
+            self._start_worker(index)
+
+        logger.info(f"Started {self._count} workers")
+
+        monitor = asyncio.create_task(self._monitor(self._cfg.get('workers', 'check_interval') or 5))
+
+        async with Bot(self._token) as bot:
+            if self._cfg.get('webhook', 'enabled'):
+                path = self._cfg.get('webhook', 'path') or '/telegram'
+                url = self._cfg.get('webhook', 'url')
+                secret_token = self._cfg.get('webhook', 'secret_token')
+
+                web = WebAppWrapper(
+                    res_path=con.DIR_RES,
+                    port=self._cfg.get('workers', 'ingress_port') or (self._cfg.get('webserver_port') or 5000) + 1
+                )
+
+                web.add_webhook(path, self._shard_raw, secret_token)
+
+                if url:
+                    await bot.set_webhook(
+                        url=url.rstrip('/') + path,
+                        secret_token=secret_token,
+                        allowed_updates=Update.ALL_TYPES,
+                        drop_pending_updates=True
+                    )
+
+                logger.info("Receiving updates via webhook...")
+                server = web.run()
+
+                stopped = asyncio.create_task(self._stop.wait())
+                stopped.add_done_callback(lambda _: setattr(server, 'should_exit', True))
+
+                await server.serve()
+                stopped.cancel()
+            else:
+                for sig in (signal.SIGINT, signal.SIGTERM):
+                    self._loop.add_signal_handler(sig, self._stop.set)
+
+                logger.info("Polling for updates...")
+                await bot.delete_webhook(drop_pending_updates=True)
+
+                poller = asyncio.create_task(self._poll(bot))
+                await self._stop.wait()
+                poller.cancel()
+
+        monitor.cancel()
+
+        # Stop relaying broadcasts before workers get stopped
+        self._broadcasts.put(SHUTDOWN)
+        await asyncio.to_thread(self._relay_thread.join)
+
+        # Let workers finish what they already received
+        for inbox in self._inboxes:
+            inbox.put(SHUTDOWN)
+
+        for index, process in enumerate(self._processes):
+            await asyncio.to_thread(process.join, 30)
+
+            if process.is_alive():
+                logger.warning(f"Worker '{process.name}' didn't stop in time")
+                process.terminate()
+
+            await self._stopped(index)
+
+        self._db_server.stop()
+        await db.close()